@@ -3,8 +3,8 @@
   
 // period = 12 Mhz / desired frequency
 module div 
-  #(parameter PERIOD=12000000,
-    parameter PULSE_POINT=12000000) 
+  #(parameter PERIOD /*verilator public*/ = 12000000,
+    parameter PULSE_POINT /*verilator public*/ = 12000000) 
    (input wire clk_in,
     input wire clk_en,
     output reg pulse_out);
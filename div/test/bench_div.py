@@ -0,0 +1,29 @@
+import cocotb
+from cocotb.triggers import RisingEdge
+from cocotb.result import TestFailure
+from cocotb.clock import Clock
+from cocotb.utils import get_sim_time
+from uart_verif.bench import CYCLES, Measure
+
+CLK_PERIOD = 1000
+
+@cocotb.test()
+def bench_div_pulses(dut):
+    """
+    run the divider for CYCLES clocks, checking the spacing of every pulse
+    """
+    PERIOD = int(dut.PERIOD)
+    cocotb.fork(Clock(dut.clk_in, CLK_PERIOD).start())
+    dut.clk_en <= 1
+    yield RisingEdge(dut.pulse_out)
+
+    measure = Measure("div")
+    last = get_sim_time()
+    for pulse in range(CYCLES // PERIOD):
+        yield RisingEdge(dut.pulse_out)
+        now = get_sim_time()
+        if now - last != PERIOD * CLK_PERIOD:
+            raise TestFailure("pulse %d came %d steps after the one before, not %d"
+                              % (pulse, now - last, PERIOD * CLK_PERIOD))
+        last = now
+    measure.done()
@@ -1,119 +1,154 @@
 import cocotb
-from cocotb.triggers import Timer, RisingEdge
+from cocotb.triggers import Timer, RisingEdge, FallingEdge
 from cocotb.result import TestFailure
 from cocotb.clock import Clock
+from cocotb.utils import get_sim_time
 
 CLK_PERIOD = 1000
 
+# pulses each test checks the spacing of. the checks look at when pulse_out
+# changed rather than at every clock, so they cost the same at any PERIOD.
+PULSES = 4
+
+class Edges(object):
+    """ the sim times of every rising and falling edge of a signal, kept without polling it """
+    def __init__(self, signal):
+        self.signal = signal
+        self.rises = []
+        self.falls = []
+        cocotb.fork(self._watch(RisingEdge, self.rises))
+        cocotb.fork(self._watch(FallingEdge, self.falls))
+
+    @cocotb.coroutine
+    def _watch(self, edge, times):
+        while True:
+            yield edge(self.signal)
+            times.append(get_sim_time())
+
+    def rises_since(self, start):
+        return [t for t in self.rises if t >= start]
+
+    def widths(self):
+        """ how long each pulse stayed high, for those that have fallen """
+        widths = []
+        falls = iter(self.falls)
+        fall = None
+        for rise in self.rises:
+            while fall is None or fall <= rise:
+                fall = next(falls, None)
+                if fall is None:
+                    return widths
+            widths.append(fall - rise)
+        return widths
+
+class div_tb(object):
+    def __init__(self, dut):
+        self.dut = dut
+        self.period = int(dut.PERIOD)
+        self.pulse_point = int(dut.PULSE_POINT)
+        self.pulse_time = self.period * CLK_PERIOD
+        self.enabled_at = None
+        self.disabled_at = None
+        dut.clk_en.setimmediatevalue(0)
+        self.edges = Edges(dut.pulse_out)
+        cocotb.fork(Clock(dut.clk_in, CLK_PERIOD).start())
+
+    @cocotb.coroutine
+    def enable(self):
+        # an edge with clk_en low parks the count at PERIOD - 1. clk_en changes
+        # just after the next, so the one after that is the first to see it
+        yield RisingEdge(self.dut.clk_in)
+        yield RisingEdge(self.dut.clk_in)
+        self.dut.clk_en <= 1
+        self.enabled_at = get_sim_time() + CLK_PERIOD
+
+    @cocotb.coroutine
+    def disable(self):
+        yield RisingEdge(self.dut.clk_in)
+        self.dut.clk_en <= 0
+        self.disabled_at = get_sim_time() + CLK_PERIOD
+
+    def first_pulse(self):
+        """
+        when the first pulse after enabling should come. disabled, the count
+        sits at PERIOD - 1, so the first enabled edge takes it to 0 and pulse_out
+        goes high on the edge after the count reaches PULSE_POINT - 1.
+        """
+        return self.enabled_at + (self.pulse_point % self.period) * CLK_PERIOD
+
+    @cocotb.coroutine
+    def run_pulses(self, count):
+        """ from enabling, run until count pulses should have come out and the last has fallen """
+        yield Timer(self.first_pulse() - get_sim_time() + (count - 1) * self.pulse_time + 3 * CLK_PERIOD // 2)
+
+    def check_pulses(self, count):
+        """ the count pulses since enabling came at the right phase, PERIOD clocks apart """
+        rises = self.edges.rises_since(self.enabled_at)
+        if len(rises) != count:
+            raise TestFailure("%d pulses after enabling, expected %d. PERIOD = %d, PULSE_POINT = %d"
+                              % (len(rises), count, self.period, self.pulse_point))
+        if rises[0] != self.first_pulse():
+            raise TestFailure("first pulse came %d clocks after enabling, expected %d"
+                              % ((rises[0] - self.enabled_at) // CLK_PERIOD,
+                                 (self.first_pulse() - self.enabled_at) // CLK_PERIOD))
+        for i in range(1, count):
+            if rises[i] - rises[i - 1] != self.pulse_time:
+                raise TestFailure("period was incorrect: pulse %d came %d steps after the one before, not %d"
+                                  % (i, rises[i] - rises[i - 1], self.pulse_time))
+
 @cocotb.test()
 def test_1_initial_access(dut):
     """
     Try accessing the design, setting the Period Parameter
     """
     dut._log.info("Running test!")
-    toggled = False
-    cocotb.fork(Clock(dut.clk_in, CLK_PERIOD).start())
-    dut.clk_en <= 1
-    yield RisingEdge(dut.clk_in)
-    for cycle in range(10):
-        yield RisingEdge(dut.clk_in)
-        if int(dut.pulse_out) == 1:
-            toggled = True
+    tb = div_tb(dut)
+    yield tb.enable()
+    yield tb.run_pulses(1)
     dut._log.info("test was run!")
-    if not toggled:
-        raise TestFailure("clock out did not toggle. There may be a parameter passing issue. PERIOD = %d." % (dut.PERIOD))
-    else:  
+    if not tb.edges.rises:
+        raise TestFailure("clock out did not toggle. There may be a parameter passing issue. PERIOD = %d." % tb.period)
+    else:
         dut._log.info("Ok!")
 
 @cocotb.test()
 def test_2_period(dut):
     """
-    verify period matches 10 (value set in makefile)
+    verify the first pulse's phase and the period (PERIOD, set in the makefile)
     """
-    PERIOD = int(dut.PERIOD)
-    cocotb.fork(Clock(dut.clk_in, CLK_PERIOD).start())
-    count = 0
-    last_value = 1 # used to catch rising edge for dividers with output greater than 1 clk
-    dut.clk_en <= 1
-    t = Timer(int(dut.PERIOD) * CLK_PERIOD * 2)
-    result = yield [RisingEdge(dut.pulse_out), t]
-    if result == t:
-        raise TestFailure("output is not toggling")
-    for cycle in range(PERIOD*10):
-        count = count + 1
-        if last_value == 0 and dut.pulse_out == 1:
-            if count != PERIOD-1:
-                raise TestFailure( "period was incorrect: %d", count)
-                count = 0
-        last_value = dut.pulse_out
-        
-        yield RisingEdge(dut.clk_in)
-    
+    tb = div_tb(dut)
+    yield tb.enable()
+    yield tb.run_pulses(PULSES)
+    tb.check_pulses(PULSES)
+
 @cocotb.test()
 def test_3_pulse_width(dut):
     """
     verify pulse_width is 1 clk
     """
-    t = Timer(int(dut.PERIOD) * CLK_PERIOD*2)
-    cocotb.fork(Clock(dut.clk_in, CLK_PERIOD).start())
-    dut.clk_en <= 1
-    result = yield [RisingEdge(dut.pulse_out), t]
-    if result ==t:
-        raise TestFailure("output didn't toggle")
-    yield RisingEdge(dut.clk_in)
-    yield Timer(1)
-    if dut.pulse_out == 1:
-        raise TestFailure("clk out should have fallen")
-
+    tb = div_tb(dut)
+    yield tb.enable()
+    yield tb.run_pulses(PULSES)
+    widths = tb.edges.widths()
+    if len(widths) != PULSES:
+        raise TestFailure("%d pulses fell, expected %d" % (len(widths), PULSES))
+    for width in widths:
+        if width != CLK_PERIOD:
+            raise TestFailure("clk out should have fallen after a clock, was high for %d steps" % width)
 
 @cocotb.test()
 def test_4_clock_enable(dut):
     """
-    verify clock enable turns on and off functionality 
+    verify clock enable turns on and off functionality
     """
-    PERIOD = int(dut.PERIOD)
-    
-    last_value = 1 # used to catch rising edge for dividers with output greater than 1 clk
-    cocotb.fork(Clock(dut.clk_in, CLK_PERIOD).start())
-    yield RisingEdge(dut.clk_in)
+    tb = div_tb(dut)
     for loop in range(2):
-        dut.clk_en <= 0
-        count = 0
-        toggled = False
-        yield RisingEdge(dut.clk_in)
-        yield RisingEdge(dut.clk_in)
-        for cycle in range(PERIOD*10):
-            count = count + 1
-            #print("pulse out: %s" % dut.pulse_out)
-            if dut.pulse_out == 1:
-                toggled = True
-            
-            if last_value == 0 and int(dut.pulse_out) == 1:
-                count = 0
-                dut._log.info("counter was reset!")
-            last_value = dut.pulse_out
-
-            yield RisingEdge(dut.clk_in)
-
-        dut._log.info("count was %d, period was %d",count, PERIOD)
-        if count < PERIOD*10:
-            raise TestFailure("clock enable didn't prevent output")
-        if toggled == True:
+        yield tb.disable()
+        yield Timer(10 * tb.pulse_time)
+        if tb.edges.rises_since(tb.disabled_at):
             raise TestFailure("output toggled unexpectedly")
-        dut.clk_en <= 1
-        yield RisingEdge(dut.clk_in)
-        count = 0
-        for cycle in range(PERIOD*10):
-            count = count + 1
-            if int(dut.pulse_out) == 1:
-                toggled = True
-            if last_value == 0 and dut.pulse_out == 1:
-                if count != PERIOD-1:
-                    count = 0
-                    raise TestFailure( "period was incorrect: %d", count)
-            last_value = dut.pulse_out
-
-            yield RisingEdge(dut.clk_in)
-        if toggled == False:
-            raise TestFailure("output did not toggle")
-    
+        if dut.pulse_out != 0:
+            raise TestFailure("clock enable didn't prevent output")
+        yield tb.enable()
+        yield tb.run_pulses(PULSES)
+        tb.check_pulses(PULSES)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Run the uart testbenches at every baud rate in baudgen.vh.
+
+    python3 tools/baud_sweep.py [-j N] [--rates 115200,9600] [module ...]
+
+Each (module, rate) pair builds with COMPILE_ARGS=-P <top>.BAUD=<divider>
+in build/baud/<module>-<rate>, and the pairs run in parallel. The tests
+read the divider back from dut.BAUD. A table of pass/fail, simulated
+clock cycles and wall time per rate is printed at the end, and the
+results are merged into build/baud/results.xml.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import simrun
+import vvpcache
+
+BAUDGEN = os.path.join(simrun.ROOT, "uart_tx", "src", "baudgen.vh")
+MODULES = ["uart_tx", "uart_rx", "uart"]
+# the testbenches run clk with a 1000 step period, and the timescale is 1ns/1ps
+CLOCK_NS = 1.0
+
+
+def rates(path=BAUDGEN):
+    """ [(baud rate, clocks per bit)] from the `define B<rate> lines, fastest first """
+    with open(path) as f:
+        found = re.findall(r"`define\s+B(\d+)\s+(\d+)", f.read())
+    return sorted(((int(rate), int(divider)) for rate, divider in found), reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run the uart testbenches at every baud rate")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="simulations to run at once (default: one per cpu)")
+    parser.add_argument("--rates", default=None,
+                        help="comma separated baud rates to run (default: all of baudgen.vh)")
+    parser.add_argument("--build-dir", default=os.path.join(simrun.ROOT, "build", "baud"))
+    parser.add_argument("--clock-ns", type=float, default=CLOCK_NS,
+                        help="clk period, to turn sim time into cycles")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't stream make output")
+    vvpcache.add_arguments(parser)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args(argv)
+
+    table = rates()
+    if args.rates:
+        wanted = set(int(rate) for rate in args.rates.split(","))
+        unknown = wanted - set(rate for rate, _ in table)
+        if unknown:
+            parser.error("not in baudgen.vh: %s" % ", ".join(str(rate) for rate in sorted(unknown)))
+        table = [(rate, divider) for rate, divider in table if rate in wanted]
+
+    jobs = []
+    for rate, divider in table:
+        for module in args.modules:
+            name = "%s-%d" % (module, rate)
+            job = simrun.Run(name, module, os.path.join(args.build_dir, name),
+                             {"COMPILE_ARGS": "-P %s.BAUD=%d" % (module, divider)})
+            job.rate = rate
+            job.divider = divider
+            jobs.append(job)
+
+    cache = vvpcache.from_arguments(args)
+    start = time.time()
+    simrun.run_all(jobs, args.jobs, quiet=args.quiet, cache=cache)
+    wall = time.time() - start
+    results = os.path.join(args.build_dir, "results.xml")
+    simrun.merge_results(jobs, results)
+
+    print()
+    print("%-8s %7s %6s %-6s %6s %14s %10s %12s" % (
+        "module", "baud", "div", "result", "tests", "sim cycles", "wall (s)", "cycles/s"))
+    for job in jobs:
+        cycles = job.sim_time / args.clock_ns
+        print("%-8s %7d %6d %-6s %3d/%-2d %14d %10.1f %12.0f" % (
+            job.module, job.rate, job.divider, "pass" if job.passed else "FAIL",
+            job.tests - job.failures, job.tests, cycles, job.wall,
+            cycles / job.wall if job.wall else 0))
+    print("total wall %.1f s, %.1f s if run one after another" % (wall, sum(job.wall for job in jobs)))
+    print("results merged into %s" % results)
+    if cache is not None:
+        print(cache.report())
+    return 0 if all(job.passed for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark the testbenches.
+
+    python3 tools/bench.py [--baseline FILE] [--threshold 0.1] [module ...]
+
+Runs the bench_<module>.py workloads in each test directory: 10k bytes
+through uart_rx, through uart_tx, both ways through the uart top and
+looped back from its tx to its rx, every channel of uart_multi at once,
+and a million clocks of div. Runs are one at a time unless -j says
+otherwise, so they don't skew each other's wall times. For each one this records:
+- wall time and sim time
+- simulated cycles per second and frames per second
+- peak RSS of the simulator
+- for the loopback, the sustained bytes per bit time
+
+The results are written as JSON along with the commit they were measured
+at. Given a baseline (an earlier output, e.g. saved with --save-baseline),
+every throughput that drops, and every peak RSS that grows, by more than
+the threshold is flagged, and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import simrun
+import vvpcache
+from uart_verif.bench import read as read_measures
+
+# (metric, True if bigger is better)
+METRICS = [("cycles_per_s", True), ("frames_per_s", True), ("peak_rss_kb", False),
+           ("bytes_per_bit", True)]
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git"] + list(args), cwd=simrun.ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def collect(jobs):
+    results = {}
+    for job in jobs:
+        for result in read_measures(os.path.join(job.build_dir, "bench.jsonl")):
+            results[result["name"]] = result
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ print each metric against the baseline; returns the regressions """
+    regressions = []
+    print("%-8s %-14s %14s %14s %8s" % ("bench", "metric", "baseline", "now", "change"))
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            print("%-8s not in the baseline" % name)
+            continue
+        for metric, bigger_better in METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if bigger_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, metric, change))
+            print("%-8s %-14s %14.1f %14.1f %+7.1f%%%s" % (name, metric, old, new, change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the testbenches")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="benchmarks to run at once (default 1, so wall times are comparable)")
+    parser.add_argument("--bytes", type=int, default=10000, help="bytes in each uart workload")
+    parser.add_argument("--cycles", type=int, default=1000000, help="clocks in the div workload")
+    parser.add_argument("--build-dir", default=os.path.join(simrun.ROOT, "build", "bench"))
+    parser.add_argument("-o", "--output", default=None,
+                        help="where to write the results (default: <build dir>/bench.json)")
+    parser.add_argument("--baseline", default=None, help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="fractional change that counts as a regression (default 0.1)")
+    parser.add_argument("--save-baseline", default=None, metavar="FILE",
+                        help="also copy the results to FILE, to compare later runs with")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't stream make output")
+    vvpcache.add_arguments(parser)
+    parser.add_argument("modules", nargs="*", default=simrun.MODULES)
+    args = parser.parse_args(argv)
+
+    env = {"UART_BENCH_BYTES": str(args.bytes), "UART_BENCH_CYCLES": str(args.cycles)}
+    jobs = []
+    for module in args.modules:
+        job = simrun.Run(module, module, os.path.join(args.build_dir, module),
+                         {"MODULE": "bench_%s" % module}, env)
+        old = os.path.join(job.build_dir, "bench.jsonl")
+        if os.path.exists(old):
+            os.remove(old)
+        jobs.append(job)
+
+    cache = vvpcache.from_arguments(args)
+    simrun.run_all(jobs, args.jobs, quiet=args.quiet, cache=cache)
+    results = collect(jobs)
+
+    report = {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "simulator": vvpcache.simulator_version(),
+        "bytes": args.bytes,
+        "cycles": args.cycles,
+        "benchmarks": results,
+    }
+    output = args.output or os.path.join(args.build_dir, "bench.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print()
+    print("%-8s %10s %14s %12s %10s %12s" % ("bench", "wall (s)", "sim cycles", "cycles/s", "frames/s", "peak RSS MB"))
+    for name, result in sorted(results.items()):
+        print("%-8s %10.1f %14d %12.0f %10.1f %12.1f" % (
+            name, result["wall_s"], result["cycles"], result["cycles_per_s"],
+            result["frames_per_s"], result["peak_rss_kb"] / 1024.0))
+    print("results for %s written to %s" % (report["commit"][:12] or "an unknown commit", output))
+
+    status = 0 if all(job.passed for job in jobs) else 1
+    missing = [job.name for job in jobs if job.name not in results]
+    if missing:
+        print("no results from %s" % ", ".join(missing))
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        print("against %s (%s)" % (args.baseline, baseline.get("commit", "")[:12]))
+        regressions = compare(results, baseline.get("benchmarks", {}), args.threshold)
+        if regressions:
+            print("%d metrics regressed by more than %.0f%%" % (len(regressions), args.threshold * 100))
+            status = 1
+    if args.save_baseline:
+        shutil.copyfile(output, args.save_baseline)
+        print("saved as the baseline in %s" % args.save_baseline)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
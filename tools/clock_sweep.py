@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Find how fast uart_rx takes back to back frames when the far end's clock
+is off from its own.
+
+    python3 tools/clock_sweep.py [-j N] [--offsets -5,-2,0,2,5] [--jitter 0.01] [VAR=value ...]
+
+Runs uart_rx/test/sweep_uart_rx.py once per offset (a percentage; positive
+means the far end's bits are longer than the dut's), all in parallel. Each
+run drives bursts of frames with less and less idle line between them and
+reports the smallest gap that came through without an error. The table
+gives, for each offset, that gap and the rate it makes in bytes per dut
+bit period; 0.1 is back to back at exactly the dut's rate. VAR=value
+arguments are passed to make, e.g. FAST=1.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import simrun
+import vvpcache
+
+OFFSETS = "-5,-4,-3,-2,-1,-0.5,0,0.5,1,2,3,4,5"
+
+
+def collect(jobs):
+    results = {}
+    for job in jobs:
+        path = os.path.join(job.build_dir, "sweep.jsonl")
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    results[job.name] = json.loads(line)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="sweep uart_rx's clock offset tolerance")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="simulations to run at once (default: one per cpu)")
+    parser.add_argument("--offsets", default=OFFSETS,
+                        help="comma separated clock offsets, in percent (default %s)" % OFFSETS)
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="most each edge is off by, as a fraction of a bit (default 0)")
+    parser.add_argument("--frames", type=int, default=200, help="frames in each burst")
+    parser.add_argument("--build-dir", default=os.path.join(simrun.ROOT, "build", "clock"))
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't stream make output")
+    vvpcache.add_arguments(parser)
+    parser.add_argument("variables", nargs="*", metavar="VAR=value")
+    args = parser.parse_args(argv)
+
+    variables = dict(arg.split("=", 1) for arg in args.variables)
+    variables["MODULE"] = "sweep_uart_rx"
+    jobs = []
+    for offset in sorted(float(offset) for offset in args.offsets.split(",")):
+        ppm = int(round(offset * 10000))
+        name = "uart_rx%+dppm" % ppm
+        job = simrun.Run(name, "uart_rx", os.path.join(args.build_dir, name), variables,
+                         {"UART_CLOCK_PPM": str(ppm), "UART_CLOCK_JITTER": str(args.jitter),
+                          "UART_SWEEP_FRAMES": str(args.frames)})
+        job.offset = offset
+        old = os.path.join(job.build_dir, "sweep.jsonl")
+        if os.path.exists(old):
+            os.remove(old)
+        jobs.append(job)
+
+    cache = vvpcache.from_arguments(args)
+    start = time.time()
+    simrun.run_all(jobs, args.jobs, quiet=args.quiet, cache=cache)
+    wall = time.time() - start
+    results = collect(jobs)
+
+    print()
+    print("%8s %8s %12s %14s %10s" % ("offset %", "ppm", "gap (bits)", "bytes/bit", "wall (s)"))
+    for job in jobs:
+        result = results.get(job.name)
+        if result is None:
+            print("%8.2f %8s %12s %14s %10.1f" % (job.offset, "", "no result", "", job.wall))
+        elif result["gap_bits"] is None:
+            print("%8.2f %8d %12s %14s %10.1f" % (job.offset, result["ppm"], "none clean", "", job.wall))
+        else:
+            print("%8.2f %8d %12.3f %14.4f %10.1f" % (job.offset, result["ppm"], result["gap_bits"],
+                                                     result["bytes_per_bit"], job.wall))
+    print("jitter %.3f of a bit, %d frames a burst, total wall %.1f s" % (args.jitter, args.frames, wall))
+    if cache is not None:
+        print(cache.report())
+    return 0 if len(results) == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Run the div testbench at every divider in baudgen.vh, at full size.
+
+    python3 tools/div_sweep.py [-j N] [--periods 104,40000] [--phases full,half,1]
+
+Each (PERIOD, PULSE_POINT) pair builds with COMPILE_ARGS=-P div.PERIOD=<p>
+-P div.PULSE_POINT=<pp> in build/div/div-<p>-<pp>, and the pairs run in
+parallel. The phases are the pulse points the uarts use, full (PERIOD,
+uart_tx) and half (PERIOD / 2, uart_rx), plus any given as a number of
+clocks. The tests check pulse timing from pulse_out's edge times, so a
+divider of 40000 costs about what one of 10 does in Python. A table of
+pass/fail, simulated clock cycles and wall time per pair is printed at
+the end, and the results are merged into build/div/results.xml.
+"""
+import argparse
+import os
+import sys
+import time
+
+import simrun
+import vvpcache
+from baud_sweep import CLOCK_NS, rates
+
+PHASES = "full,half,1"
+
+
+def pulse_point(period, phase):
+    if phase == "full":
+        return period
+    if phase == "half":
+        return period // 2
+    return int(phase)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run the div testbench at every baudgen.vh divider")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="simulations to run at once (default: one per cpu)")
+    parser.add_argument("--periods", default=None,
+                        help="comma separated PERIODs to run (default: every divider in baudgen.vh)")
+    parser.add_argument("--phases", default=PHASES,
+                        help="comma separated pulse points, full, half or clocks (default %s)" % PHASES)
+    parser.add_argument("--build-dir", default=os.path.join(simrun.ROOT, "build", "div"))
+    parser.add_argument("--clock-ns", type=float, default=CLOCK_NS,
+                        help="clk_in period, to turn sim time into cycles")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't stream make output")
+    vvpcache.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.periods:
+        periods = [int(period) for period in args.periods.split(",")]
+    else:
+        periods = [divider for _, divider in rates()]
+    if any(period < 2 for period in periods):
+        parser.error("div needs a PERIOD of at least 2")
+
+    jobs = []
+    for period in periods:
+        points = []
+        for phase in args.phases.split(","):
+            point = pulse_point(period, phase)
+            if not 1 <= point <= period:
+                parser.error("pulse point %s is outside 1..%d" % (phase, period))
+            if point not in points:
+                points.append(point)
+        for point in points:
+            name = "div-%d-%d" % (period, point)
+            job = simrun.Run(name, "div", os.path.join(args.build_dir, name),
+                             {"COMPILE_ARGS": "-P div.PERIOD=%d -P div.PULSE_POINT=%d" % (period, point)})
+            job.period = period
+            job.pulse_point = point
+            jobs.append(job)
+
+    cache = vvpcache.from_arguments(args)
+    start = time.time()
+    simrun.run_all(jobs, args.jobs, quiet=args.quiet, cache=cache)
+    wall = time.time() - start
+    results = os.path.join(args.build_dir, "results.xml")
+    simrun.merge_results(jobs, results)
+
+    print()
+    print("%7s %7s %-6s %6s %14s %10s %12s" % (
+        "period", "pulse", "result", "tests", "sim cycles", "wall (s)", "cycles/s"))
+    for job in jobs:
+        cycles = job.sim_time / args.clock_ns
+        print("%7d %7d %-6s %3d/%-2d %14d %10.1f %12.0f" % (
+            job.period, job.pulse_point, "pass" if job.passed else "FAIL",
+            job.tests - job.failures, job.tests, cycles, job.wall,
+            cycles / job.wall if job.wall else 0))
+    print("total wall %.1f s, %.1f s if run one after another" % (wall, sum(job.wall for job in jobs)))
+    print("results merged into %s" % results)
+    if cache is not None:
+        print(cache.report())
+    return 0 if all(job.passed for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
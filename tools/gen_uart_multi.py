@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Write a wrapper with N copies of the uart top level, side by side.
+
+    python3 tools/gen_uart_multi.py [-o uart_multi_4.v] 4
+
+The channels share clk and rstn, and each one's ports come out with a
+ch<i>_ prefix: ch0_i_rx, ch0_o_tx, ch0_i_tx_data and so on. Channel i's
+divider is the parameter CH<i>_BAUD, so the rates are picked when it's
+built (-P uart_multi.CH<i>_BAUD=<divider>) and one generated file serves
+every mix of rates with that many channels. CHANNELS is a parameter too,
+for the testbench to read. uart_multi/test/Makefile runs this. The file
+is only rewritten when it would change, so make doesn't rebuild for
+nothing.
+"""
+import argparse
+import os
+import sys
+
+# 115200 at 12 MHz, as in uart.v, until the build picks a rate
+DEFAULT_BAUD = 104
+
+PORTS = [
+    ("input wire", "", "i_rx"),
+    ("input wire", "", "i_tx_start"),
+    ("input wire", "[7:0] ", "i_tx_data"),
+    ("output wire", "[7:0] ", "o_rx_data"),
+    ("output wire", "", "o_rx_data_valid"),
+    ("output wire", "", "o_tx"),
+    ("output wire", "", "o_tx_ready"),
+]
+
+
+def wrapper(channels, name="uart_multi"):
+    lines = [
+        "// %d uarts side by side, written by tools/gen_uart_multi.py. don't edit it," % channels,
+        "// change the generator. each channel's divider is CH<i>_BAUD.",
+        "`default_nettype none",
+        "`timescale 1ns/1ps",
+        "",
+        "module %s" % name,
+        "  #(parameter CHANNELS /*verilator public*/ = %d," % channels,
+    ]
+    params = ["    parameter CH%d_BAUD /*verilator public*/ = %d" % (i, DEFAULT_BAUD) for i in range(channels)]
+    lines.append(",\n".join(params) + ")")
+    ports = ["    input wire clk", "    input wire rstn"]
+    for i in range(channels):
+        for direction, width, port in PORTS:
+            ports.append("    %s %sch%d_%s" % (direction, width, i, port))
+    lines.append("   (" + ",\n".join(ports).lstrip() + "\n    );")
+    for i in range(channels):
+        connections = ",\n        ".join(".%s(ch%d_%s)" % (port, i, port) for _, _, port in PORTS)
+        lines.extend([
+            "",
+            "   uart #(CH%d_BAUD)" % i,
+            "   ch%d (.clk(clk), .rstn(rstn), %s);" % (i, connections),
+        ])
+    lines.extend(["", "endmodule // %s" % name, ""])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="write an N channel uart wrapper")
+    parser.add_argument("-o", "--output", default=None,
+                        help="file to write (default: uart_multi_<channels>.v)")
+    parser.add_argument("channels", type=int)
+    args = parser.parse_args(argv)
+    if args.channels < 1:
+        parser.error("need at least one channel")
+
+    output = args.output or "uart_multi_%d.v" % args.channels
+    text = wrapper(args.channels)
+    if os.path.exists(output):
+        with open(output) as f:
+            if f.read() == text:
+                return 0
+    with open(output, "w") as f:
+        f.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
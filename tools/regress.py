@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Run the module regressions in parallel.
+
+    python3 tools/regress.py [-j N] [module ...] [VAR=value ...]
+
+Every module (div, uart_tx, uart_rx, uart and uart_multi, unless some are
+named) is built and simulated in build/<module>, all at the same time by
+default. Output is streamed as it comes, the per-module results.xml files
+are merged into build/results.xml, and the wall time of each module is
+printed along with the total. VAR=value arguments are passed to make.
+
+With --waves, each failing test of a module that supports it is then run
+again on its own with a waveform dump around the failure, see
+uart_verif/waves.py.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import simrun
+import vvpcache
+
+# modules whose top level has the waves control
+WAVES = ["uart"]
+
+# what uart/test/Makefile dumps unless WAVES_FORMAT says otherwise
+WAVES_FORMAT = "fst"
+
+
+def waves_reruns(jobs, variables):
+    """ a job per failed test, to run it alone with a dump around where it failed """
+    reruns = []
+    for job in jobs:
+        if job.module not in WAVES:
+            continue
+        for test, message in job.failed:
+            found = re.search(r"(\d+) ns into the test", message)
+            if found:
+                env = {"UART_WAVES": "around", "UART_WAVES_AROUND": found.group(1)}
+            else:
+                env = {"UART_WAVES": "on"}
+            waves_file = "%s.%s" % (test, variables.get("WAVES_FORMAT", WAVES_FORMAT))
+            rerun_vars = dict(variables, TESTCASE=test, WAVES="1", WAVES_FILE=waves_file)
+            rerun = simrun.Run("%s-%s" % (job.name, test), job.module,
+                               os.path.join(job.build_dir, "waves", test), rerun_vars, env)
+            reruns.append(rerun)
+    return reruns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run the module regressions in parallel")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="modules to run at once (default: all of them)")
+    parser.add_argument("--build-dir", default=os.path.join(simrun.ROOT, "build"))
+    parser.add_argument("--results", default=None,
+                        help="merged results file (default: <build dir>/results.xml)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't stream make output")
+    parser.add_argument("--waves", action="store_true",
+                        help="rerun failing tests alone, dumping waveforms around the failure")
+    vvpcache.add_arguments(parser)
+    parser.add_argument("args", nargs="*", metavar="module | VAR=value")
+    args = parser.parse_args(argv)
+
+    variables = dict(arg.split("=", 1) for arg in args.args if "=" in arg)
+    modules = [arg.strip("/").split("/")[0] for arg in args.args if "=" not in arg] or simrun.MODULES
+    for module in modules:
+        if not os.path.exists(simrun.makefile(module)):
+            parser.error("no test makefile for %s" % module)
+
+    jobs = [simrun.Run(module, module, os.path.join(args.build_dir, module), variables)
+            for module in modules]
+    cache = vvpcache.from_arguments(args)
+    start = time.time()
+    simrun.run_all(jobs, args.jobs, quiet=args.quiet, cache=cache)
+    wall = time.time() - start
+    results = args.results or os.path.join(args.build_dir, "results.xml")
+    simrun.merge_results(jobs, results)
+
+    print()
+    print("%-10s %6s %6s %10s" % ("module", "tests", "fail", "wall (s)"))
+    for job in jobs:
+        status = ""
+        if job.returncode != 0:
+            status = "  FAILED (make exited %s)" % job.returncode
+        elif not job.passed:
+            status = "  FAILED"
+        print("%-10s %6d %6d %10.1f%s" % (job.name, job.tests, job.failures, job.wall, status))
+    print("total wall %.1f s, %.1f s if run one after another" % (wall, sum(job.wall for job in jobs)))
+    print("results merged into %s" % results)
+    if args.waves:
+        reruns = waves_reruns(jobs, variables)
+        simrun.run_all(reruns, args.jobs, quiet=args.quiet, cache=cache)
+        for rerun in reruns:
+            print("%s: %s" % (rerun.name, rerun.waves if os.path.exists(rerun.waves) else "no waveforms written"))
+    if cache is not None:
+        print(cache.report())
+    return 0 if all(job.passed for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compare simulators on the benchmark workloads.
+
+    python3 tools/sim_compare.py [--sims icarus,verilator] [--bytes B] [module ...]
+
+Runs the bench_<module>.py workloads (see tools/bench.py) under each
+simulator, with make SIM=<sim>, one run at a time so their wall times
+are comparable. Each simulator builds in <build dir>/<sim>/<module>.
+It prints the simulated cycles per second of every workload under each
+simulator, and how many times faster than the first simulator the
+others are, as a table and as markdown to paste into the README. The
+figures are also written as JSON, with the commit and the simulator
+versions they were measured with.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import simrun
+import vvpcache
+from bench import collect, git
+
+SIMS = "icarus,verilator"
+VERSION = {"icarus": ["iverilog", "-V"], "verilator": ["verilator", "--version"]}
+
+
+def version(sim):
+    try:
+        out = subprocess.run(VERSION.get(sim, [sim, "--version"]), stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+    except OSError:
+        return ""
+    return out.splitlines()[0] if out else ""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="compare simulators on the benchmark workloads")
+    parser.add_argument("--sims", default=SIMS, help="comma separated simulators, the first the baseline "
+                        "(default %s)" % SIMS)
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="benchmarks to run at once (default 1, so wall times are comparable)")
+    parser.add_argument("--bytes", type=int, default=10000, help="bytes in each uart workload")
+    parser.add_argument("--cycles", type=int, default=1000000, help="clocks in the div workload")
+    parser.add_argument("--build-dir", default=os.path.join(simrun.ROOT, "build", "sim-compare"))
+    parser.add_argument("-o", "--output", default=None,
+                        help="where to write the results (default: <build dir>/sim_compare.json)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't stream make output")
+    vvpcache.add_arguments(parser)
+    parser.add_argument("modules", nargs="*", default=simrun.MODULES)
+    args = parser.parse_args(argv)
+    sims = args.sims.split(",")
+
+    env = {"UART_BENCH_BYTES": str(args.bytes), "UART_BENCH_CYCLES": str(args.cycles)}
+    cache = vvpcache.from_arguments(args)
+    jobs = {}
+    results = {}
+    for sim in sims:
+        jobs[sim] = []
+        for module in args.modules:
+            job = simrun.Run("%s-%s" % (sim, module), module, os.path.join(args.build_dir, sim, module),
+                             {"MODULE": "bench_%s" % module, "SIM": sim}, env)
+            old = os.path.join(job.build_dir, "bench.jsonl")
+            if os.path.exists(old):
+                os.remove(old)
+            jobs[sim].append(job)
+        simrun.run_all(jobs[sim], args.jobs, quiet=args.quiet, cache=cache)
+        results[sim] = collect(jobs[sim])
+
+    report = {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "simulators": dict((sim, version(sim)) for sim in sims),
+        "bytes": args.bytes,
+        "cycles": args.cycles,
+        "benchmarks": results,
+    }
+    output = args.output or os.path.join(args.build_dir, "sim_compare.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    names = sorted(set(name for sim in sims for name in results[sim]))
+    base = sims[0]
+    rows = []
+    for name in names:
+        rates = [results[sim].get(name, {}).get("cycles_per_s") for sim in sims]
+        speedups = [rate / rates[0] if rate and rates[0] else None for rate in rates[1:]]
+        rows.append((name, rates, speedups))
+
+    print()
+    print("cycles/s" + " " * 6 + "".join(" %14s" % sim for sim in sims)
+          + "".join(" %14s" % ("x " + base) for _ in sims[1:]))
+    for name, rates, speedups in rows:
+        print("%-14s" % name + "".join(" %14.0f" % rate if rate else " %14s" % "-" for rate in rates)
+              + "".join(" %14.1f" % speedup if speedup else " %14s" % "-" for speedup in speedups))
+    print()
+    print("| bench | " + " | ".join("%s cycles/s" % sim for sim in sims)
+          + "".join(" | %s vs %s" % (sim, base) for sim in sims[1:]) + " |")
+    print("|---" * (2 * len(sims)) + "|")
+    for name, rates, speedups in rows:
+        print("| %s | " % name + " | ".join("%.0f" % rate if rate else "-" for rate in rates)
+              + "".join(" | %.1fx" % speedup if speedup else " | -" for speedup in speedups) + " |")
+    print()
+    print("%s, measured at %s, written to %s" % (
+        ", ".join(report["simulators"][sim] or sim for sim in sims),
+        report["commit"][:12] or "an unknown commit", output))
+    if cache is not None:
+        print(cache.report())
+
+    failed = [job.name for sim in sims for job in jobs[sim] if not job.passed]
+    if failed:
+        print("failed: %s" % ", ".join(failed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Helpers for driving the cocotb test makefiles from scripts.
+
+Each run gets a build directory of its own and runs
+``make -f <module>/test/Makefile`` from there, so sim_build/ and
+results.xml never collide between runs going on at the same time.
+Output is streamed back a line at a time, prefixed with the run's name.
+Given a vvpcache.Cache, runs reuse compiled simulations already built.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the scripts read back what the testbenches write with uart_verif's own
+# readers, so it's importable from here as it is from the test directories
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+MODULES = ["div", "uart_tx", "uart_rx", "uart", "uart_multi"]
+
+_output_lock = threading.Lock()
+
+
+def makefile(module):
+    return os.path.join(ROOT, module, "test", "Makefile")
+
+
+class Run(object):
+    """ one make invocation and what came of it """
+    def __init__(self, name, module, build_dir, variables=None, env=None):
+        self.name = name
+        self.module = module
+        self.build_dir = build_dir
+        self.variables = variables or {}
+        self.env = env
+        self.returncode = None
+        self.wall = 0.0
+        self.tests = 0
+        self.failures = 0
+        self.sim_time = 0.0
+        self.found_results = False
+        self.failed = []
+        self.cache_hit = None
+
+    @property
+    def results(self):
+        return os.path.join(self.build_dir, "results.xml")
+
+    @property
+    def waves(self):
+        """ the waveforms the run was asked to write (WAVES_FILE), or None """
+        waves_file = self.variables.get("WAVES_FILE")
+        return os.path.join(self.build_dir, waves_file) if waves_file else None
+
+    @property
+    def passed(self):
+        return self.returncode == 0 and self.tests > 0 and self.failures == 0
+
+    def command(self):
+        cmd = ["make", "-f", makefile(self.module)]
+        cmd.extend("%s=%s" % item for item in sorted(self.variables.items()))
+        return cmd
+
+
+def run(job, stream=sys.stdout, quiet=False, cache=None):
+    """ run job (a Run) to completion, streaming its output """
+    os.makedirs(job.build_dir, exist_ok=True)
+    # a results.xml left from last time would hide a run that never simulated
+    if os.path.exists(job.results):
+        os.remove(job.results)
+    if cache is not None:
+        cache.fetch(job)
+    env = None
+    if job.env:
+        env = dict(os.environ)
+        env.update(job.env)
+    start = time.time()
+    proc = subprocess.Popen(job.command(), cwd=job.build_dir, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    for line in proc.stdout:
+        if not quiet:
+            with _output_lock:
+                stream.write("[%s] %s" % (job.name, line))
+                stream.flush()
+    job.returncode = proc.wait()
+    job.wall = time.time() - start
+    if cache is not None:
+        cache.store(job)
+    read_results(job)
+    return job
+
+
+def run_all(jobs, workers=None, stream=sys.stdout, quiet=False, cache=None):
+    """
+    run jobs in parallel, workers at a time (default: all of them), and
+    return them in the order given. the simulators are separate processes,
+    so a thread per job is only there to wait on them.
+    """
+    jobs = list(jobs)
+    with ThreadPoolExecutor(max_workers=workers or len(jobs) or 1) as pool:
+        for future in [pool.submit(run, job, stream, quiet, cache) for job in jobs]:
+            future.result()
+    return jobs
+
+
+def read_results(job):
+    """ fill in job's test and failure counts, and failed tests, from its results.xml """
+    job.found_results = os.path.exists(job.results)
+    if not job.found_results:
+        return
+    for case in ET.parse(job.results).iter("testcase"):
+        job.tests += 1
+        failure = case.find("failure")
+        if failure is None:
+            failure = case.find("error")
+        if failure is not None:
+            job.failures += 1
+            # cocotb puts the exception text in an attribute, not the body
+            job.failed.append((case.get("name"), " ".join(list(failure.attrib.values()) + [failure.text or ""])))
+        job.sim_time += float(case.get("sim_time_ns", 0))
+
+
+def merge_results(jobs, path):
+    """
+    write one results.xml holding every job's testsuites, renamed after
+    the job. a job that left no results.xml shows up as a failed testcase.
+    """
+    root = ET.Element("testsuites", name="results")
+    for job in jobs:
+        if job.found_results:
+            for suite in ET.parse(job.results).iter("testsuite"):
+                suite.set("name", job.name)
+                suite.set("package", job.name)
+                root.append(suite)
+        else:
+            suite = ET.SubElement(root, "testsuite", name=job.name, package=job.name)
+            case = ET.SubElement(suite, "testcase", classname=job.name, name="make")
+            ET.SubElement(case, "failure",
+                          message="no results.xml, make exited with %s" % job.returncode)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    ET.ElementTree(root).write(path, encoding="UTF-8", xml_declaration=True)
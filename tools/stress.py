@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Run the seeded stress tests, many seeds at once.
+
+    python3 tools/stress.py [-j N] [--seed S] [--shards K] [--bytes B] [--test T] [module ...] [VAR=value ...]
+
+Each of uart_rx, uart_tx and uart (unless some are named) runs its
+stress test K times, each shard in a simulator process of its own with a
+seed drawn from S, so the same S and K always give the same runs. Every
+failing shard is listed with the command that reruns it exactly.
+VAR=value arguments are passed to make, e.g. FAST=1.
+
+--test shards another test instead, e.g. --test test_3_fast_and_many
+uart_rx. Each shard also gets UART_SHARD=i/K (see uart_verif/shard.py),
+which a stream test uses to send only its i'th slice of the stream; the
+whole stream is then --bytes long, in UART_STREAM_BYTES. The shards that
+record their throughput are added up into frames per second across all
+of them, next to the slowest shard's own rate.
+
+Each shard stops once it's reached the coverage target (--coverage, a
+fraction of each group's bins, 0 to always send every byte). The shards'
+coverage files are merged per module into <build dir>/<module>.coverage.json
+and the merged coverage is printed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import simrun
+import vvpcache
+from uart_verif.bench import read as read_measures
+
+# the stress test in each module
+TESTS = {"uart_rx": "test_6_stress", "uart_tx": "test_6_stress", "uart": "test_3_stress"}
+
+
+def shard_seeds(seed, shards):
+    """ a seed per shard, all following from seed """
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for _ in range(shards)]
+
+
+def merge_coverage(paths):
+    """ or together coverage files, each a group name to its size and hits bitmap """
+    merged = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for name, group in json.load(f).items():
+                size, hits = merged.get(name, (group["size"], 0))
+                merged[name] = (size, hits | int(group["hits"], 16))
+    return merged
+
+
+def read_throughput(path):
+    """ the last measurement a shard recorded, or None """
+    measures = read_measures(path)
+    return measures[-1] if measures else None
+
+
+def rerun_command(job):
+    """ how to run job's shard again by hand, from the top of the repo """
+    env = " ".join("%s=%s" % item for item in sorted(job.env.items()))
+    variables = " ".join("%s=%s" % item for item in sorted(job.variables.items()))
+    return "%s make -C %s/test %s" % (env, job.module, variables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run the seeded stress tests in parallel")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="simulations to run at once (default: one per cpu)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed the shards' seeds are drawn from (default: a random one)")
+    parser.add_argument("--shards", type=int, default=4, help="seeds to run for each module")
+    parser.add_argument("--bytes", type=int, default=2000,
+                        help="most bytes in each stream, or in the whole stream a stream test splits")
+    parser.add_argument("--test", default=None,
+                        help="test to shard in every module (default: each module's stress test)")
+    parser.add_argument("--coverage", type=float, default=1.0,
+                        help="fraction of coverage a shard stops at (default 1, 0 never stops early)")
+    parser.add_argument("--build-dir", default=os.path.join(simrun.ROOT, "build", "stress"))
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't stream make output")
+    vvpcache.add_arguments(parser)
+    parser.add_argument("args", nargs="*", metavar="module | VAR=value")
+    args = parser.parse_args(argv)
+
+    variables = dict(arg.split("=", 1) for arg in args.args if "=" in arg)
+    modules = [arg.strip("/").split("/")[0] for arg in args.args if "=" not in arg] or sorted(TESTS)
+    for module in modules:
+        if args.test is None and module not in TESTS:
+            parser.error("%s has no stress test" % module)
+        if not os.path.exists(simrun.makefile(module)):
+            parser.error("no test makefile for %s" % module)
+    seed = args.seed
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(32)
+
+    jobs = []
+    for module in modules:
+        for shard, shard_seed in enumerate(shard_seeds(seed, args.shards)):
+            name = "%s-%d" % (module, shard)
+            job = simrun.Run(name, module, os.path.join(args.build_dir, name),
+                             dict(variables, TESTCASE=args.test or TESTS[module]),
+                             {"UART_SEED": str(shard_seed), "UART_STRESS_BYTES": str(args.bytes),
+                              "UART_STREAM_BYTES": str(args.bytes), "UART_COVERAGE": str(args.coverage),
+                              "UART_SHARD": "%d/%d" % (shard, args.shards)})
+            job.seed = shard_seed
+            for old in ("coverage.json", "bench.jsonl"):
+                old = os.path.join(job.build_dir, old)
+                if os.path.exists(old):
+                    os.remove(old)
+            jobs.append(job)
+
+    cache = vvpcache.from_arguments(args)
+    start = time.time()
+    simrun.run_all(jobs, args.jobs, quiet=args.quiet, cache=cache)
+    wall = time.time() - start
+    results = os.path.join(args.build_dir, "results.xml")
+    simrun.merge_results(jobs, results)
+
+    print()
+    print("%-10s %12s %-6s %10s %10s %10s" % ("shard", "seed", "result", "wall (s)", "frames", "frames/s"))
+    for job in jobs:
+        job.throughput = read_throughput(os.path.join(job.build_dir, "bench.jsonl"))
+        frames = "%10d %10.1f" % (job.throughput["frames"], job.throughput["frames_per_s"]) if job.throughput else ""
+        print("%-10s %12d %-6s %10.1f %s" % (job.name, job.seed, "pass" if job.passed else "FAIL", job.wall, frames))
+    print("seed %d, %d shards of %d bytes, total wall %.1f s" % (seed, args.shards, args.bytes, wall))
+    print("results merged into %s" % results)
+    for module in modules:
+        measured = [job for job in jobs if job.module == module and job.throughput]
+        if measured:
+            # the shards ran side by side, so together they took as long as
+            # the longest. that's the measured part, not the make around it
+            frames = sum(job.throughput["frames"] for job in measured)
+            longest = max(job.throughput["wall_s"] for job in measured)
+            print("%s: %d frames from %d shards, %.1f frames/s together, %.1f/s for the slowest shard"
+                  % (module, frames, len(measured), frames / longest if longest else 0.0,
+                     min(job.throughput["frames_per_s"] for job in measured)))
+    for module in modules:
+        merged = merge_coverage(os.path.join(job.build_dir, "coverage.json")
+                                for job in jobs if job.module == module)
+        path = os.path.join(args.build_dir, "%s.coverage.json" % module)
+        with open(path, "w") as f:
+            json.dump(dict((name, {"size": size, "hits": "%x" % hits})
+                           for name, (size, hits) in merged.items()), f, indent=1, sort_keys=True)
+        print()
+        print("%s coverage, merged into %s" % (module, path))
+        for name, (size, hits) in sorted(merged.items()):
+            print("    %-16s %4d/%d" % (name, bin(hits).count("1"), size))
+    failed = [job for job in jobs if not job.passed]
+    if failed:
+        print()
+        print("%d shards failed, to rerun them:" % len(failed))
+        for job in failed:
+            print("    %s" % rerun_command(job))
+    if cache is not None:
+        print(cache.report())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Check a recording made by uart_verif/recorder.py, after the run.
+
+    python3 tools/uart_decode.py [--show N] soak.rec
+
+Every serial line in the recording is decoded in bulk: start bits are
+found from its falling edges, and each frame is sampled in the middle of
+its ten bits with one vectorised lookup. The bytes have to match the
+stimulus recorded for that line, in order. Every frame also needs a low
+start bit and a high stop bit, and every edge inside a frame has to
+land on a bit boundary. The data put out with each rising valid strobe
+is checked against its stimulus the same way. It prints a line per check
+and exits 1 if any of them failed. The decoding and checks are
+uart_verif.recorder's read() and check(), the same ones uart/test's
+test_5_soak runs on its recording as it finishes.
+"""
+import argparse
+import os
+import sys
+
+# uart_verif lives at the top of the repo, next to tools/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uart_verif.recorder import check, read
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="check a uart recording")
+    parser.add_argument("--show", type=int, default=5, help="errors to list for each check")
+    parser.add_argument("recording")
+    args = parser.parse_args(argv)
+    header, streams = read(args.recording)
+    changes = sum(len(times) for times, _ in streams.values())
+    print("%s: %d recorded values, bit time %d steps" % (args.recording, changes, header["bit_time"]))
+    return 0 if check(header, streams, args.show) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Decode uart frames straight out of a VCD, however big, in one pass.
+
+    python3 tools/vcd_analyze.py [--signal o_tx] [--bit-time T] [--bytes-out PREFIX] uart.vcd
+
+The file is memory mapped and read a line at a time through generators,
+so memory use stays the same whatever its size. Only the changes on
+the selected lines are decoded. By default those are o_tx and i_rx, in
+whatever scope they're in. A --signal that doesn't name a scope matches
+the shallowest scope that has it, so a port isn't decoded again from
+each instance it's wired through; a dotted --signal matches the end of
+a full name. Each line is sampled like uart_rx does, in the middle of each
+bit from a falling start edge. For every line it reports:
+- frames decoded, start bits that were glitches and framing errors (a
+  low stop bit), with the times of the first few
+- a histogram of bit times, each measured from a run of bits between two
+  edges inside a frame
+- a histogram of the idle gaps between frames, in bits
+- the first bytes of the stream; --bytes-out writes all of them to
+  <PREFIX><full dotted name>.bin
+
+Times are in the VCD's timescale. --bit-time gives the bit period in
+those units. Without it, the bit time is the shortest interval that
+occurs at least three times between the first few hundred edges.
+
+To get a VCD of the uart top level, make WAVES=1 WAVES_FORMAT=vcd in
+uart/test.
+"""
+import argparse
+import mmap
+import sys
+from collections import Counter, defaultdict
+from itertools import chain
+
+# changes looked at to work out the bit time, when it isn't given
+ESTIMATE_CHANGES = 512
+SIGNALS = ["o_tx", "i_rx"]
+
+
+def lines(mm):
+    """ the file's lines, stripped, without reading it all in """
+    readline = mm.readline
+    while True:
+        line = readline()
+        if not line:
+            return
+        line = line.strip()
+        if line:
+            yield line
+
+
+def header(source):
+    """ read the definitions: (timescale, {id code: [dotted names]}) """
+    timescale = b""
+    scope = []
+    codes = defaultdict(list)
+    for line in source:
+        words = line.split()
+        keyword = words[0]
+        if keyword == b"$scope":
+            scope.append(words[2].decode())
+        elif keyword == b"$upscope":
+            scope.pop()
+        elif keyword == b"$var":
+            # $var wire 1 ! o_tx $end, or with a bit range after the name
+            codes[words[3]].append(".".join(scope + [words[4].decode()]))
+        elif keyword == b"$timescale":
+            words = words[1:]
+            while b"$end" not in words:
+                words += next(source).split()
+            timescale = b" ".join(words[:words.index(b"$end")])
+        elif keyword == b"$enddefinitions":
+            break
+    return timescale.decode().strip(), codes
+
+
+def changes(source, wanted):
+    """
+    (time, id code, value) for each change on a wanted code, x and z as
+    None, then (time, None, None) with the time the dump ends at
+    """
+    time = 0
+    for line in source:
+        first = line[0]
+        if first == 0x23:                     # '#'
+            time = int(line[1:])
+        elif first in (0x30, 0x31):           # '0' or '1'
+            code = line[1:]
+            if code in wanted:
+                yield time, code, first - 0x30
+        elif first in (0x78, 0x7a, 0x58, 0x5a):   # x z X Z
+            code = line[1:]
+            if code in wanted:
+                yield time, code, None
+        elif first in (0x62, 0x42):           # 'b', a vector: only its lsb matters here
+            value, _, code = line.partition(b" ")
+            if code in wanted:
+                bit = value[-1:]
+                yield time, code, int(bit) if bit in (b"0", b"1") else None
+    yield time, None, None
+
+
+def estimate_bit_time(buffered):
+    """ the shortest interval between edges on a line that turns up at least three times """
+    last = {}
+    intervals = Counter()
+    for time, code, value in buffered:
+        if code is None or value is None:
+            continue
+        previous = last.get(code)
+        if previous is not None and previous[1] != value:
+            intervals[time - previous[0]] += 1
+        if previous is None or previous[1] != value:
+            last[code] = (time, value)
+    common = [interval for interval, count in intervals.items() if count >= 3 and interval > 0]
+    return min(common) if common else None
+
+
+class LineDecoder(object):
+    """ frames on one line idling high, fed its changes in time order """
+    def __init__(self, name, bit_time, show, output=None):
+        self.name = name
+        self.bit = bit_time
+        self.show = show
+        self.output = output
+        self.level = 1
+        self.start = None
+        self.last_end = None
+        self.sample_at = 0
+        self.bits = 0
+        self.index = 0
+        self.run_start = 0
+        self.frames = 0
+        self.glitches = 0
+        self.framing = 0
+        self.framing_times = []
+        self.first_bytes = bytearray()
+        self.chunk = bytearray()
+        self.bit_times = Counter()
+        self.gaps = Counter()
+
+    def _sample(self, until):
+        # take every sample due before until, at the level before it
+        while self.start is not None and self.sample_at < until:
+            if self.index == 0 and self.level != 0:
+                # back high before the middle of the start bit
+                self.glitches += 1
+                self.start = None
+                return
+            self.bits |= self.level << self.index
+            self.index += 1
+            self.sample_at += self.bit
+            if self.index == 10:
+                self._frame()
+
+    def _frame(self):
+        frame = self.bits
+        self.frames += 1
+        if not frame >> 9:
+            self.framing += 1
+            if len(self.framing_times) < self.show:
+                self.framing_times.append(self.start)
+        data = (frame >> 1) & 0xff
+        if len(self.first_bytes) < self.show:
+            self.first_bytes.append(data)
+        if self.output is not None:
+            self.chunk.append(data)
+            if len(self.chunk) >= 1 << 16:
+                self.output.write(self.chunk)
+                del self.chunk[:]
+        self.last_end = self.start + 10 * self.bit
+        self.start = None
+
+    def change(self, time, value):
+        if value is None or value == self.level:
+            return
+        self._sample(time)
+        if self.start is not None:
+            # an edge inside a frame ends a run of whole bits
+            run = time - self.run_start
+            bits = int(round(run / self.bit))
+            if bits:
+                self.bit_times[int(round(run / bits))] += 1
+            self.run_start = time
+        elif value == 0:
+            self.start = time
+            self.run_start = time
+            self.sample_at = time + self.bit // 2
+            self.bits = 0
+            self.index = 0
+            if self.last_end is not None:
+                self.gaps[round((time - self.last_end) / self.bit, 1)] += 1
+        self.level = value
+
+    def finish(self, time):
+        # the line holds its level to the end of the dump
+        self._sample(time + 1)
+        if self.output is not None and self.chunk:
+            self.output.write(self.chunk)
+
+
+def histogram(counter, limit, unit):
+    lines = []
+    total = sum(counter.values())
+    for value, count in counter.most_common(limit):
+        lines.append("    %12s %s %10d  %5.1f%%" % (value, unit, count, 100.0 * count / total))
+    if len(counter) > limit:
+        lines.append("    (%d more values)" % (len(counter) - limit))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="decode uart frames from a vcd in one streaming pass")
+    parser.add_argument("--signal", action="append", default=None,
+                        help="line to decode, by name or dotted path (default: %s)" % ", ".join(SIGNALS))
+    parser.add_argument("--bit-time", type=int, default=None,
+                        help="bit period in the vcd's time units (default: worked out from the first edges)")
+    parser.add_argument("--bytes-out", default=None, metavar="PREFIX",
+                        help="write each line's bytes to PREFIX<signal>.bin")
+    parser.add_argument("--show", type=int, default=16, help="bytes and errors to print for each line")
+    parser.add_argument("--bins", type=int, default=10, help="histogram rows to print")
+    parser.add_argument("vcd")
+    args = parser.parse_args(argv)
+
+    with open(args.vcd, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        source = lines(mm)
+        timescale, codes = header(source)
+
+        wanted = {}
+        for pattern in args.signal or SIGNALS:
+            found = [(name.count("."), code, name) for code, names in sorted(codes.items())
+                     for name in names if name == pattern or name.endswith("." + pattern)]
+            if found and "." not in pattern:
+                shallowest = min(depth for depth, _, _ in found)
+                found = [match for match in found if match[0] == shallowest]
+            for _, code, name in found:
+                wanted.setdefault(code, name)
+        if not wanted:
+            parser.error("none of %s are in %s" % (", ".join(args.signal or SIGNALS), args.vcd))
+
+        stream = changes(source, wanted)
+        bit_time = args.bit_time
+        if bit_time is None:
+            buffered = []
+            for change in stream:
+                buffered.append(change)
+                if len(buffered) == ESTIMATE_CHANGES:
+                    break
+            bit_time = estimate_bit_time(buffered)
+            if bit_time is None:
+                parser.error("too few edges to work out the bit time, give --bit-time")
+            stream = chain(buffered, stream)
+
+        outputs = {}
+        decoders = {}
+        for code, name in wanted.items():
+            if args.bytes_out is not None:
+                outputs[code] = open("%s%s.bin" % (args.bytes_out, name), "wb")
+            decoders[code] = LineDecoder(name, bit_time, args.show, outputs.get(code))
+
+        for time, code, value in stream:
+            if code is None:
+                break
+            decoders[code].change(time, value)
+        for decoder in decoders.values():
+            decoder.finish(time)
+        for output in outputs.values():
+            output.close()
+        mm.close()
+
+    print("%s: timescale %s, bit time %d, %d lines, ran to %d" % (
+        args.vcd, timescale, bit_time, len(decoders), time))
+    errors = 0
+    for decoder in sorted(decoders.values(), key=lambda decoder: decoder.name):
+        print()
+        print("%s: %d frames, %d glitches, %d framing errors" % (
+            decoder.name, decoder.frames, decoder.glitches, decoder.framing))
+        for at in decoder.framing_times:
+            print("    framing error in the frame starting at %d" % at)
+        if decoder.first_bytes:
+            print("  bytes: %s%s" % (" ".join("%02x" % byte for byte in decoder.first_bytes),
+                                     " ..." if decoder.frames > len(decoder.first_bytes) else ""))
+        if decoder.output is not None:
+            print("  all %d bytes written to %s" % (decoder.frames, decoder.output.name))
+        if decoder.bit_times:
+            print("  bit times:")
+            print(histogram(decoder.bit_times, args.bins, ""))
+        if decoder.gaps:
+            print("  gaps between frames:")
+            print(histogram(decoder.gaps, args.bins, "bits"))
+        errors += decoder.framing
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+# included by each test makefile once its COMPILE_ARGS are set, just before
+# cocotb's makefiles. make SIM=verilator builds the same cocotb tests with
+# verilator instead of icarus; nothing changes with the default SIM.
+ifeq ($(SIM),verilator)
+
+# the makefiles and the scripts in tools/ set parameters icarus's way, as
+# -P <top>.<name>=<value>. verilator only overrides the top level's, as
+# -G<name>=<value>, so the one becomes the other here. lint warnings, like
+# the widths in div's counter compare, are only warnings.
+VERILATOR_COMPILE_ARGS := $(patsubst $(strip $(TOPLEVEL)).%,-G%,$(filter-out -P,$(COMPILE_ARGS))) -Wno-fatal
+
+# the makefiles set COMPILE_ARGS with override, which would swallow the
+# flags cocotb's verilator makefile appends to it (--vpi, --prefix Vtop and
+# the rest). it starts over as an ordinary variable instead.
+override undefine COMPILE_ARGS
+COMPILE_ARGS := $(VERILATOR_COMPILE_ARGS)
+
+# uart.v's dump control is for icarus. verilator traces the whole design
+# instead, to WAVES_FILE (or the dump file of cocotb's verilator main).
+ifneq ($(WAVES),)
+COMPILE_ARGS += $(if $(filter vcd,$(WAVES_FORMAT)),--trace,--trace-fst) --trace-structs
+SIM_ARGS += --trace $(if $(WAVES_FILE),--trace-file $(WAVES_FILE))
+endif
+
+endif
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Content addressed cache of compiled Icarus simulations.
+
+A build is keyed on a hash of everything iverilog reads or is told:
+the contents of VERILOG_SOURCES and of every file they `include, the
+top level, COMPILE_ARGS (which carries the -P parameter overrides) and
+the iverilog version. The test makefiles report those through their
+print-<VAR> target. A source make generates, like uart_multi's wrapper,
+is made first so its contents go in the key too.
+
+Before a run, a hit copies the cached sim.vvp into the run's sim_build
+and make skips compiling. A miss removes any sim.vvp already there so
+make rebuilds it, and the result is stored afterwards. When the cache
+grows past its size limit, the least recently used entries are dropped.
+Runs with another SIM (e.g. SIM=verilator) aren't cached.
+
+    python3 tools/vvpcache.py [--clear]
+
+shows (or clears) what is in the cache.
+"""
+import argparse
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+import simrun
+
+DIRECTORY = os.path.join(simrun.ROOT, "build", "vvp-cache")
+SIZE = 256 << 20
+QUERY = ["VERILOG_SOURCES", "TOPLEVEL", "COMPILE_ARGS", "SIM_BUILD", "SIM"]
+
+_INCLUDE = re.compile(r'`include\s+"([^"]+)"')
+_simulator = None
+
+
+def simulator_version():
+    global _simulator
+    if _simulator is None:
+        try:
+            out = subprocess.run(["iverilog", "-V"], stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+            _simulator = out.splitlines()[0] if out else ""
+        except OSError:
+            _simulator = ""
+    return _simulator
+
+
+def make_variables(job, names=QUERY):
+    """ the values make gives names for job, through the makefile's print-% target """
+    cmd = job.command() + ["print-%s" % name for name in names]
+    os.makedirs(job.build_dir, exist_ok=True)
+    out = subprocess.run(cmd, cwd=job.build_dir, stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+    values = dict.fromkeys(names, "")
+    for line in out.splitlines():
+        name, _, value = line.partition("=")
+        if name in values:
+            values[name] = value.strip()
+    return values
+
+
+def _include_dirs(compile_args):
+    args = shlex.split(compile_args)
+    dirs = []
+    for i, arg in enumerate(args):
+        if arg == "-I" and i + 1 < len(args):
+            dirs.append(args[i + 1])
+        elif arg.startswith("-I"):
+            dirs.append(arg[2:])
+    return dirs
+
+
+def _hash_file(digest, path, search, seen):
+    path = os.path.realpath(path)
+    if path in seen:
+        return
+    seen.add(path)
+    with open(path, "rb") as f:
+        text = f.read()
+    digest.update(path.encode() + b"\0")
+    digest.update(hashlib.sha256(text).digest())
+    for name in _INCLUDE.findall(text.decode("latin-1")):
+        # the places icarus looks, in order, then next to the includer
+        for directory in search + [os.path.dirname(path)]:
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate):
+                _hash_file(digest, candidate, search, seen)
+                break
+        else:
+            digest.update(b"missing " + name.encode() + b"\0")
+
+
+def key(job, variables):
+    """ the cache key for job, given the make variables it builds with """
+    digest = hashlib.sha256()
+    for name in ("TOPLEVEL", "COMPILE_ARGS"):
+        digest.update(("%s=%s\0" % (name, variables[name])).encode())
+    digest.update(simulator_version().encode() + b"\0")
+    search = [job.build_dir] + [os.path.join(job.build_dir, d) for d in _include_dirs(variables["COMPILE_ARGS"])]
+    seen = set()
+    for source in variables["VERILOG_SOURCES"].split():
+        _hash_file(digest, source, search, seen)
+    return digest.hexdigest()
+
+
+class Cache(object):
+    """ sim.vvp files under directory, at most size bytes of them """
+    def __init__(self, directory=DIRECTORY, size=SIZE):
+        self.directory = directory
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".vvp")
+
+    def entries(self):
+        """ [(mtime, size, path)] of the cached builds, least recently used first """
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".vvp"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, stat.st_size, path))
+        return sorted(found)
+
+    def fetch(self, job):
+        """ put job's sim.vvp in place from the cache, or clear it out to be built """
+        variables = make_variables(job)
+        if variables["SIM"] not in ("", "icarus"):
+            # only icarus builds a sim.vvp; anything else builds as usual
+            job.cache_key = None
+            job.cache_hit = False
+            return False
+        job.vvp = os.path.join(job.build_dir, variables["SIM_BUILD"] or "sim_build", "sim.vvp")
+        sources = variables["VERILOG_SOURCES"].split()
+        missing = [source for source in sources if not os.path.isfile(source)]
+        if missing:
+            # sources make writes itself, like uart_multi's wrapper: have it
+            # write them now, so they're hashed like any other
+            subprocess.run(job.command() + missing, cwd=job.build_dir,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not all(os.path.isfile(source) for source in sources):
+            # the build will fail anyway; don't keep anything for it
+            job.cache_key = None
+            job.cache_hit = False
+            if os.path.exists(job.vvp):
+                os.remove(job.vvp)
+            return False
+        job.cache_key = key(job, variables)
+        cached = self._path(job.cache_key)
+        with self._lock:
+            job.cache_hit = os.path.exists(cached)
+            if job.cache_hit:
+                self.hits += 1
+                # touching it is what keeps it out of the way of eviction
+                os.utime(cached)
+            else:
+                self.misses += 1
+        if job.cache_hit:
+            os.makedirs(os.path.dirname(job.vvp), exist_ok=True)
+            # copyfile rather than copy2, so make sees it as newer than the sources
+            shutil.copyfile(cached, job.vvp)
+        elif os.path.exists(job.vvp):
+            os.remove(job.vvp)
+        return job.cache_hit
+
+    def store(self, job):
+        """ keep what make built for job, then trim the cache to size """
+        if job.cache_hit or job.cache_key is None or not os.path.exists(job.vvp):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(job.vvp, tmp)
+        os.replace(tmp, self._path(job.cache_key))
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def report(self):
+        return "vvp cache: %d hits, %d misses" % (self.hits, self.misses)
+
+
+def add_arguments(parser):
+    """ the cache options the runner scripts share """
+    parser.add_argument("--no-cache", action="store_true", help="always compile")
+    parser.add_argument("--cache-dir", default=DIRECTORY)
+    parser.add_argument("--cache-size", type=int, default=SIZE >> 20, help="cache size limit in MB")
+
+
+def from_arguments(args):
+    if args.no_cache:
+        return None
+    return Cache(args.cache_dir, args.cache_size << 20)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="show or clear the compiled simulation cache")
+    parser.add_argument("--cache-dir", default=DIRECTORY)
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args(argv)
+    cache = Cache(args.cache_dir)
+    entries = cache.entries()
+    if args.clear:
+        for _, _, path in entries:
+            os.remove(path)
+        print("removed %d entries" % len(entries))
+        return 0
+    print("%d entries, %.1f MB in %s" % (len(entries), sum(size for _, size, _ in entries) / 1e6,
+                                           args.cache_dir))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
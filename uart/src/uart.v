@@ -1,9 +1,10 @@
 `default_nettype none
+`timescale 1ns/1ps
 `include "../../uart_tx/src/baudgen.vh"
 
 
 module uart
-  #(parameter BAUD=`B115200)
+  #(parameter BAUD /*verilator public*/ = `B115200)
    (input wire clk,
     input wire rstn,
     input wire i_rx,
@@ -26,11 +27,42 @@ module uart
    assign o_tx = tx;
    assign o_tx_ready = tx_ready;
    
+`ifdef COCOTB_SIM
+   // under verilator the whole design is traced instead, see tools/verilator.mk
+`ifndef VERILATOR
+   // waveforms are off by default. +waves=<file> sets up a dump of the
+   // +waves_scope=all|top|rx|tx part of the design, paused; the testbench
+   // then turns it on and off by writing waves (see uart_verif/waves.py).
+   // the format comes from IVERILOG_DUMPER (fst, vcd, ...).
+   reg          waves = 0;
+   reg [8*256-1:0] waves_file;
+   reg [8*8-1:0] waves_scope;
+
    initial begin
-      $dumpfile("uart.vcd");
-      $dumpvars(0, uart);
+      if ($value$plusargs("waves=%s", waves_file)) begin
+         if (!$value$plusargs("waves_scope=%s", waves_scope))
+           waves_scope = "all";
+         $dumpfile(waves_file);
+         if (waves_scope == "top")
+           $dumpvars(1, uart);
+         else if (waves_scope == "rx")
+           $dumpvars(0, uart_rx_inst);
+         else if (waves_scope == "tx")
+           $dumpvars(0, uart_tx_inst);
+         else
+           $dumpvars(0, uart);
+         $dumpoff;
+      end
    end
 
+   always @(waves)
+     if (waves)
+       $dumpon;
+     else
+       $dumpoff;
+`endif // VERILATOR
+`endif
+
    uart_rx #(BAUD)
    uart_rx_inst (.clk(clk), .rstn(rstn), .i_rx(i_rx), .o_data(rx_data), .o_rcv(rx_data_valid));
 
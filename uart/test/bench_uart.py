@@ -0,0 +1,41 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.result import TestFailure
+from cocotb.triggers import RisingEdge
+from uart_verif.bench import BYTES, Measure, pattern
+from test_uart import CLK_PERIOD, uart_tb
+
+@cocotb.test()
+def bench_duplex(dut):
+    """
+    BYTES bytes into the rx side while BYTES go out of the tx side, both checked
+    """
+    tb = uart_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    measure = Measure("uart")
+    data = pattern(BYTES)
+    tb.tx_drv.append(data)
+    yield tb.rx_drv.send(data)
+    yield tb.completion.wait()
+    measure.done(frames=2 * BYTES)
+
+@cocotb.test()
+def bench_loopback(dut):
+    """
+    BYTES bytes out of the tx side and back in through rx, looped back
+    """
+    tb = uart_tb(dut, loopback=True)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    measure = Measure("uart_loopback")
+    yield tb.tx_drv.send(pattern(BYTES))
+    yield tb.completion.wait()
+    summary = tb.loopback.summary()
+    measure.done(frames=2 * BYTES, **summary)
+    if tb.loopback.errors:
+        raise TestFailure("loopback dropped %(dropped)d and corrupted %(corrupted)d bytes" % summary)
@@ -0,0 +1,22 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from uart_verif.bench import BYTES, Measure
+from test_uart_multi import CLK_PERIOD, uart_multi_tb
+
+@cocotb.test()
+def bench_channels(dut):
+    """
+    BYTES bytes each way through the slowest channel, and as many as fit in
+    the same time through the others, every channel at once, all checked
+    """
+    tb = uart_multi_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    measure = Measure("uart_multi")
+    frames = tb.stream(BYTES)
+    yield tb.wait()
+    measure.done(frames=frames, channels=len(tb.channels),
+                 dividers=[channel.baud for channel in tb.channels])
@@ -0,0 +1,163 @@
+import cocotb
+import logging
+import os
+import time
+from cocotb.triggers import FallingEdge, Timer, RisingEdge
+from cocotb.clock import Clock
+from cocotb.result import TestFailure
+from cocotb.utils import get_sim_time
+from uart_verif.bench import pattern
+from uart_verif.completion import Completion
+from uart_verif.drivers import UartRxDriver, UartTopTxDriver
+from uart_verif.model import UartModel
+from uart_verif.monitors import UartTopRxOMonitor, UartTopTxIMonitor, UartTopTxOMonitor
+from uart_verif.scoreboard import UartScoreboard
+from uart_verif.trace import dump_on_failure
+
+# clk period in sim steps (ps). each channel times everything in its own bit
+# periods, so the tests hold whatever mix of rates the wrapper was built with.
+CLK_PERIOD = 1000
+
+# bytes each way on the slowest channel in test_2_all_channels. kept short for
+# the everyday run; the long runs are tools/bench.py's, or set it higher
+BYTES = int(os.environ.get("UART_MULTI_BYTES", "16"))
+
+
+class channel_tb(object):
+    """
+    the drivers, monitors, model, scoreboard and completion for one
+    channel of the wrapper, checked the same way as the uart top level.
+    the channel's ports are the top level's with a ch<i>_ prefix, which
+    goes in the bus names.
+    """
+    def __init__(self, dut, index):
+        self.dut = dut
+        self.name = "ch%d" % index
+        self.baud = int(getattr(dut, "CH%d_BAUD" % index))
+        self.bit_time = self.baud * CLK_PERIOD
+        self.rx = getattr(dut, self.name + "_i_rx")
+        self.tx_ready = getattr(dut, self.name + "_o_tx_ready")
+        self.model = UartModel()
+        self.scoreboard = UartScoreboard(dut)
+
+        self.output_rx_mon = UartTopRxOMonitor(dut, self.name + "_o", dut.clk, self.baud, reset_n=dut.rstn)
+        self.rx_expected = self.scoreboard.add_interface(self.output_rx_mon, self.name + " rx")
+        self.output_tx_mon = UartTopTxOMonitor(dut, self.name + "_o", dut.clk, self.baud, reset_n=dut.rstn)
+        self.tx_expected = self.scoreboard.add_interface(self.output_tx_mon, self.name + " tx")
+        self.input_tx_mon = UartTopTxIMonitor(dut, self.name + "_i", dut.clk, self.baud, reset_n=dut.rstn,
+                                              callback=self.tx_model)
+
+        self.output_rx_mon.log.setLevel(logging.INFO)
+        self.scoreboard.log.setLevel(logging.INFO)
+
+        self.rx_drv = UartRxDriver(self.rx, dut.clk, self.baud, model=self.rx_model)
+        self.tx_drv = UartTopTxDriver(dut, self.name + "_i", dut.clk, self.tx_ready)
+
+        self.completion = Completion(self.scoreboard, self.bit_time // 1000)
+        self.completion.add_driver(self.rx_drv)
+        self.completion.add_driver(self.tx_drv)
+        self.completion.add_line(self.rx)
+        self.completion.add_idle(self.name + "_o_tx_ready", lambda: self.tx_ready.value.integer == 1)
+        self.completion.add_idle(self.name + "_o_tx", lambda: not self.output_tx_mon.transmitting)
+
+    def rx_model(self, data):
+        # bytes sent while the dut is held in reset are dropped
+        if self.dut.rstn == 0:
+            return
+        self.rx_expected.extend(self.model.rx_expected(data))
+
+    def tx_model(self, data):
+        self.tx_expected.extend(self.model.tx_expected([data]))
+
+
+class uart_multi_tb(object):
+    def __init__(self, dut):
+        self.dut = dut
+        self.channels = [channel_tb(dut, i) for i in range(int(dut.CHANNELS))]
+        self.dut._log.setLevel(logging.INFO)
+        self.dut._log.info("%d channels, dividers %s", len(self.channels),
+                           ", ".join(str(channel.baud) for channel in self.channels))
+
+    @cocotb.coroutine
+    def reset_dut(self, duration):
+        self.dut.rstn <= 0
+        for channel in self.channels:
+            channel.scoreboard.flush()
+        yield Timer(duration)
+        yield FallingEdge(self.dut.clk)
+        self.dut.rstn <= 1
+        self.dut._log.info("reset complete")
+
+    def stream(self, count):
+        """
+        queue count bytes each way on the slowest channel, and on each of
+        the others as many as it sends in the same time, so they all finish
+        together. returns the frames queued, both ways, on every channel.
+        """
+        slowest = max(channel.baud for channel in self.channels)
+        frames = 0
+        for channel in self.channels:
+            data = pattern(max(1, count * slowest // channel.baud))
+            channel.rx_drv.append(data)
+            channel.tx_drv.append(data)
+            frames += 2 * len(data)
+        return frames
+
+    @cocotb.coroutine
+    def wait(self):
+        """ until every channel is done, see Completion.wait() """
+        for channel in self.channels:
+            yield channel.completion.wait()
+
+    def matched(self):
+        return sum(channel.scoreboard.matched for channel in self.channels)
+
+
+@cocotb.test()
+@dump_on_failure
+def test_1_each_channel(dut):
+    """
+    a byte in and a byte out on every channel at once
+    """
+    tb = uart_multi_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    for i, channel in enumerate(tb.channels):
+        channel.rx_drv.append(bytes([0x41 + i]))
+        channel.tx_drv.append(bytes([0x61 + i]))
+    yield tb.wait()
+    for channel in tb.channels:
+        dut._log.info("%s: %r", channel.name, channel.scoreboard.stats())
+
+
+@cocotb.test()
+@dump_on_failure
+def test_2_all_channels(dut):
+    """
+    UART_MULTI_BYTES bytes each way through the slowest channel, and as
+    many as fit in the same time through the others, every channel at
+    once. logs the aggregate throughput
+    """
+    tb = uart_multi_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    sim_start = get_sim_time("ns")
+    wall_start = time.time()
+    frames = tb.stream(BYTES)
+    yield tb.wait()
+    wall = time.time() - wall_start
+    cycles = (get_sim_time("ns") - sim_start) * 1000 // CLK_PERIOD
+    for channel in tb.channels:
+        dut._log.info("%s: divider %d, %d frames each way, %r", channel.name, channel.baud,
+                      channel.rx_drv.frames, channel.scoreboard.stats())
+    dut._log.info("%d channels: %d frames in %.1f s, %.1f frames/s, %d cycles (%.0f/s)",
+                  len(tb.channels), frames, wall, frames / wall if wall else 0.0,
+                  cycles, cycles / wall if wall else 0.0)
+    if tb.matched() != frames:
+        raise TestFailure("%d of %d frames checked" % (tb.matched(), frames))
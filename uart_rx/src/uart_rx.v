@@ -1,8 +1,9 @@
 `default_nettype none
+`timescale 1ns/1ps
 `include "../../uart_tx/src/baudgen.vh"
   
   module uart_rx
-    #(parameter BAUD=`B115200)
+    #(parameter BAUD /*verilator public*/ = `B115200)
     (input wire clk,
      input wire rstn,
      input wire i_rx,
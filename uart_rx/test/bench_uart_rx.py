@@ -0,0 +1,20 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from uart_verif.bench import BYTES, Measure, pattern
+from test_uart_rx import CLK_PERIOD, uart_rx_tb
+
+@cocotb.test()
+def bench_rx_stream(dut):
+    """
+    BYTES bytes back to back into uart_rx, every one checked
+    """
+    tb = uart_rx_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    measure = Measure("uart_rx")
+    yield tb.rx_drv.send(pattern(BYTES))
+    yield tb.completion.wait()
+    measure.done(frames=BYTES)
@@ -0,0 +1,63 @@
+"""
+How fast uart_rx takes back to back frames from a far end whose clock
+is off from its own.
+
+tools/clock_sweep.py runs this once per offset. UART_CLOCK_PPM is how much
+longer the far end's bits are than the dut's, in parts per million, and
+UART_CLOCK_JITTER the most each edge is off by, as a fraction of a bit.
+Each result is appended as a line of JSON to UART_SWEEP_FILE.
+"""
+import json
+import logging
+import os
+import random
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, Timer
+from test_uart_rx import CLK_PERIOD, uart_rx_tb
+
+PPM = int(os.environ.get("UART_CLOCK_PPM", "0"))
+JITTER = float(os.environ.get("UART_CLOCK_JITTER", "0"))
+FRAMES = int(os.environ.get("UART_SWEEP_FRAMES", "200"))
+OUTPUT = os.environ.get("UART_SWEEP_FILE", "sweep.jsonl")
+# idle bit periods between frames to try, fastest first
+GAPS = [i / 8 for i in range(25)]
+
+
+@cocotb.test()
+def sweep_clock_offset(dut):
+    """
+    the smallest gap between frames, so the highest back to back rate,
+    at which FRAMES frames all come through uart_rx
+    """
+    tb = uart_rx_tb(dut)
+    # errors are what's being measured; count them rather than fail on them
+    tb.scoreboard.fail_immediately = False
+    tb.scoreboard.log.setLevel(logging.CRITICAL)
+    tb.rx_drv.ppm = PPM
+    tb.rx_drv.jitter = JITTER
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    rng = random.Random(PPM)
+    result = {"ppm": PPM, "jitter": JITTER, "frames": FRAMES, "gap_bits": None, "bytes_per_bit": 0.0}
+    for gap in GAPS:
+        tb.rx_drv.gap = gap
+        mismatched = tb.scoreboard.mismatched
+        yield tb.rx_drv.send(rng.getrandbits(8 * FRAMES).to_bytes(FRAMES, "little"))
+        yield Timer(20 * tb.bit_time)
+        errors = tb.scoreboard.mismatched - mismatched + tb.scoreboard.outstanding
+        dut._log.info("%+d ppm, %.3f bits between frames: %d errors in %d frames", PPM, gap, errors, FRAMES)
+        if not errors:
+            # a frame and its gap, in the dut's bit periods
+            result["gap_bits"] = gap
+            result["bytes_per_bit"] = 1 / ((10 + gap) * (1 + PPM / 1e6))
+            break
+        # start the next try from a receiver that isn't part way into a frame
+        yield tb.reset_dut(10 * CLK_PERIOD)
+        yield Timer(2 * tb.bit_time)
+    with open(OUTPUT, "a") as f:
+        f.write(json.dumps(result) + "\n")
+    dut._log.info("%+d ppm: %s", PPM, result)
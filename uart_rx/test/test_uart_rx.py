@@ -1,245 +1,302 @@
 import cocotb
 import logging
-from cocotb.triggers import Timer, RisingEdge, ClockCycles
+import os
+import tempfile
+import numpy as np
+from cocotb.triggers import FallingEdge, Timer, RisingEdge
 from cocotb.clock import Clock
-from cocotb.monitors import Monitor, BusMonitor
-from cocotb.scoreboard import Scoreboard
-from cocotb.utils import get_sim_time
 from cocotb.result import TestFailure
+from uart_verif.bench import read as read_measures
+from uart_verif.completion import Completion
+from uart_verif.coverage import Coverage, RxCoverage
+from uart_verif.drivers import UartRxDriver
+from uart_verif.model import UartModel
+from uart_verif.monitors import UartRxOMonitor
+from uart_verif.scoreboard import DEPTH, UartScoreboard
+from uart_verif.shard import Shard
+from uart_verif.stimulus import RxStress, Stimulus, break_clocks
+from uart_verif.trace import dump_on_failure
 
-class UartRxMonitor(Monitor):
-    """ observe the RX input of a Uart """
-    def __init__(self, rx, clock, baud, reset_n=None, callback=None, event=None):
-        self.clock = clock
-        self.rx = rx
-        self.baud = baud
-        self.receiving = False
-        self.buff = 0
-        self.count = 0
-        self.reset_n = reset_n
-        Monitor.__init__(self, callback, event)
+# clk period in sim steps (ps). everything that depends on the uart's rate is
+# timed in bit periods (tb.bit_time) instead, so the tests hold at any BAUD.
+CLK_PERIOD = 1000
+
+# bytes in test_3_fast_and_many's stream, split between the shards when sharded
+STREAM_BYTES = int(os.environ.get("UART_STREAM_BYTES", "300"))
 
-    @cocotb.coroutine
-    def _monitor_recv(self):
-        # this coroutine's responsibility is to sample at the points
-        # where it's interesting in your testbench to know what the input was,
-        # presumably because it'll have an effect on expected output.
-        # sometimes that's just every clockcycle, but for uarts, it's often
-        # once per baud period, when you know you're receiving / transmitting
-        yield Timer(1)
-        while True:
-            if self.receiving == False:
-                # if we're not receiving, we need to check for receiving every reset cycle
-                yield RisingEdge(self.clock)
-                vec = self.rx
-                self.log.debug("value of rx is %s while not receiving" % vec)
-                if self.reset_n is not None and self.reset_n == 0: 
-                    self._recv({"vec":vec, "reset":True})
-                #if presumably receiving a character
-                elif vec == 0:
-                    self.receiving = True
-                    self.count = 0
-                    #start us out sampling once per period, with a half period delay
-                    yield ClockCycles(self.clock, self.baud /2)
-                    #we want to sample here to verify it wasn't a glitch falling edge
-                    self._recv({"vec":vec, "reset":False})
-            else:
-                # wait another period, putting us into actual character bits
-                yield ClockCycles(self.clock, self.baud)
-                vec = self.rx
-                self.log.debug("value of rx is %s while receiving" % vec)
-                self._recv({"vec":vec,"reset":False})
-                self.count = self.count + 1 
-                if self.count == 9:
-                    self.receiving = False
-                    
-                
-class UartRxOMonitor(BusMonitor):
-    _signals = [ "rcv", "data"]
-    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None, event=None, bus_seperator="_"):
-        BusMonitor.__init__(self, entity, name, clock, reset, reset_n, callback, event, bus_seperator)
-        self.baud_rate = baud_rate
-        self.receiving = False
-        
-    @cocotb.coroutine
-    def _monitor_recv(self):
-        yield Timer(1) # gets us past x's on startup. 
-        while True:
-            yield RisingEdge(self.clock)
-            transaction = dict(self.bus.capture())
-            rcv = transaction["rcv"]
-            data  = transaction["data"]
-            if self.in_reset:
-                self.log.debug("reset: rcv %s, data %s" % (rcv, data))
-                self._recv({"rcv":rcv.integer, "data":data.integer})
-            else:
-                if rcv == 1:
-                    self.log.debug("got something: rcv %s, data %s" % (rcv, data))
-                    self._recv({"rcv":rcv.integer, "data":data.integer})
-                    
 class uart_rx_tb(object):
-    def __init__(self, dut):
+    def __init__(self, dut, depth=DEPTH):
         self.dut = dut
+        self.bit_time = int(self.dut.BAUD) * CLK_PERIOD
         self.output_mon = UartRxOMonitor(dut, "o", dut.clk, int(self.dut.BAUD), reset_n=dut.rstn)
-        self.input_mon = UartRxMonitor(dut.i_rx, dut.clk, int(self.dut.BAUD), reset_n=dut.rstn, callback=self.rx_model)
-        self.output_expected = [{"rcv":0,"data":0}] # necessary because order of calls  
-        self.scoreboard = Scoreboard(dut)
-        self.scoreboard.add_interface(self.output_mon, self.output_expected)
+        self.model = UartModel()
+        self.scoreboard = UartScoreboard(dut, depth)
+        self.output_expected = self.scoreboard.add_interface(self.output_mon)
 
         self.output_mon.log.setLevel(logging.INFO)
-        self.input_mon.log.setLevel(logging.INFO)
         self.dut._log.setLevel(logging.INFO)
         self.scoreboard.log.setLevel(logging.INFO)
-        
-        self.dut.i_rx <= 1
-        self.bits = 0
-        self.shift = 0
-        self.last_reset = False
-        
-    def rx_model(self, transaction):
-        rx = transaction["vec"]
-        in_reset = transaction["reset"]
-        self.dut._log.debug("model called at time %s with transaction %s %s in reset" %(get_sim_time("ns"),rx, in_reset))
-        if in_reset:
-            self.dut._log.debug("output expected length: %d" % len(self.output_expected))
-            self.output_expected.append({"rcv":0,"data":0})
-            self.bits = 0
-            self.shift = 0
-            self.last_reset = True
-        else:
-            self.shift = self.shift + (int(rx) << self.bits)
-            self.dut._log.debug("bits %d, shift %x, rx %d" % (self.bits, self.shift, rx))
-            self.bits = (self.bits + 1) % 10
-            if self.bits == 0:
-                len_oe = len(self.output_expected)
-                if len_oe == 1 and self.last_reset:
-                    self.last_reset = False
-                    popped = self.output_expected.pop() #ugh
-                    self.dut._log.warning("popping data from output expected: %r" % popped)
-                elif len_oe > 1:
-                    self.dut._log.error("some nonsense with output expected happened")
-                self.dut._log.debug("expected output len: %d" % len(self.output_expected))
-
-                if self.shift >=  (1<<9) :
-                    expected = (self.shift >> 1 ) % (1 << 8) 
-                    self.output_expected.append({"rcv":1,"data":expected})
-                    self.dut._log.debug("model expects uart output %s" % (bin(expected)))
-                else:
-                    self.dut._log.info("break mode detected")
-
-                self.shift = 0
+
+        #the driver hands the model each block of bytes just before driving it,
+        #so expectations are set up a block at a time instead of a bit at a time.
+        self.rx_drv = UartRxDriver(dut.i_rx, dut.clk, int(self.dut.BAUD), model=self.rx_model)
+
+        #tests finish with completion.wait() rather than sleeping: it returns
+        #once everything's been sent, the line has gone quiet and the scoreboard
+        #has seen everything it expected. it times things in ns.
+        self.completion = Completion(self.scoreboard, self.bit_time // 1000)
+        self.completion.add_driver(self.rx_drv)
+        self.completion.add_line(dut.i_rx)
+
+        #functional coverage, sampled from the output monitor, and by the
+        #stress test for resets and glitches.
+        self.coverage = Coverage()
+        self.rx_coverage = RxCoverage(self.coverage, self.bit_time, int(self.dut.BAUD))
+        self.output_mon.add_callback(self.rx_coverage.received)
+
+    def rx_model(self, data):
+        # bytes sent while the dut is held in reset are dropped
+        if self.dut.rstn == 0:
+            self.dut._log.debug("in reset, not expecting %d bytes", len(data))
+            return
+        self.output_expected.extend(self.model.rx_expected(data))
 
     @cocotb.coroutine
     def reset_dut(self, duration):
         self.dut.rstn <= 0
+        self.scoreboard.flush()
         yield Timer(duration)
+        # rstn is asynchronous. let go of it between clock edges rather than
+        # on one, where icarus and verilator order the release and the edge
+        # differently
+        yield FallingEdge(self.dut.clk)
         self.dut.rstn <= 1
         self.dut._log.info("reset complete")
 
     @cocotb.coroutine
     def rcv_char(self, char):
-        shift = (ord(char)*2 )+ 2**9
-        self.dut._log.info("receiving char %s (%x) as %x" %(char, ord(char), shift))
-        yield RisingEdge(self.dut.clk)
-        for i in range(10):
-            self.dut.i_rx <= shift % 2
-            shift = shift >> 1
-            yield ClockCycles(self.dut.clk, int(self.dut.BAUD))
+        self.dut._log.info("receiving char %s (%x)", char, ord(char))
+        yield self.rx_drv.send(bytes([ord(char)]))
         
 
         
 @cocotb.test()
+@dump_on_failure
 def test_1_rcv_a_char(dut):
     """
     basic test, receive a character
     """
     tb = uart_rx_tb(dut)
     tb.dut._log.info("running uartrx test")
-    cocotb.fork(Clock(dut.clk, 1000).start())
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
 
-    yield tb.reset_dut(10000)
-    yield Timer(10000)
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
     yield RisingEdge(dut.clk)
     yield tb.rcv_char('k')
+    yield tb.completion.wait()
     tb.dut._log.info("k test passed successfully")
-    yield Timer(1000000)
     yield tb.rcv_char('K')
-    yield Timer(1000000)
-    tb.dut._log.info("output expected len %d " % len(tb.output_expected))
+    yield tb.completion.wait()
+    tb.dut._log.info("output expected len %d ", len(tb.output_expected))
 
 @cocotb.test()
+@dump_on_failure
 def test_2_break(dut):
     """
     break in line, detect / don't spit out chars. 
     """
     tb = uart_rx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
-    yield tb.reset_dut(10000)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
 
-    yield Timer(10000)
+    yield Timer(10 * CLK_PERIOD)
     yield RisingEdge(dut.clk)
+    #the line held low for four frames, rising half way into the fifth's
+    #fifth bit. the model is given the frames the dut should sample: four
+    #breaks, which put nothing out, and what's left of the fifth, whose high
+    #stop bit makes it a byte once the line's back up.
+    frames, bit = 4, 5
+    tb.rx_model(np.array([[0] * 10] * frames + [[0] * bit + [1] * (10 - bit)], dtype=np.uint8))
     tb.dut.i_rx <= 0
     re = RisingEdge(tb.dut.o_rcv)
-    result = yield [Timer(5000000), re]
+    result = yield [Timer(break_clocks(int(tb.dut.BAUD), frames, bit) * CLK_PERIOD), re]
 
     if result == re:
         raise TestFailure("break condition had output")
-
-    #since the scoreboard is triggered by output, makesure
-    #the expected output isn't backed up.
-    if len(tb.output_expected) > 0:
-        raise TestFailure("model had expected output still")
+    tb.dut.i_rx <= 1
+    yield tb.completion.wait()
+    if tb.model.breaks != frames or tb.scoreboard.matched != 1 or tb.scoreboard.outstanding != 0:
+        raise TestFailure("after the break: %d breaks modelled, %r" % (tb.model.breaks, tb.scoreboard.stats()))
 
 @cocotb.test()
+@dump_on_failure
 def test_3_fast_and_many(dut):
     """
-    rcv characters fast
+    rcv characters fast, UART_STREAM_BYTES of them back to back. with
+    UART_SHARD=i/K, only the i'th of K slices of the stream
     """
     tb = uart_rx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
-    yield tb.reset_dut(10000)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
 
-    yield Timer(10000)
+    yield Timer(10 * CLK_PERIOD)
     yield RisingEdge(dut.clk)
 
     my_char = ord(' ')
-    for i in range(300):
-        yield tb.rcv_char(chr((my_char + i) % 256))
+    shard = Shard()
+    start, stop = shard.range(STREAM_BYTES)
+    shard.start("uart_rx-test_3_fast_and_many")
+    yield tb.rx_drv.send(bytes((my_char + i) % 256 for i in range(start, stop)))
+    yield tb.completion.wait()
+    shard.done(tb.rx_drv.frames)
+    tb.dut._log.info("drove %d frames in %d ns", tb.rx_drv.frames, tb.rx_drv.sim_time)
+    tb.dut._log.info("scoreboard: %r", tb.scoreboard.stats())
+    tb.dut._log.info("coverage:\n%s", tb.coverage.report())
+    tb.coverage.save()
     
 
 @cocotb.test()
+@dump_on_failure
 def test_4_reset(dut):
     """
     character's received during reset are ignored. 
     """
     tb = uart_rx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
-    yield tb.reset_dut(10000)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
     tb.dut.rstn <= 0
 
-    yield Timer(10000)
+    yield Timer(10 * CLK_PERIOD)
     yield RisingEdge(dut.clk)
 
     my_char = ord('a')
     for i in range(3):
         yield tb.rcv_char(chr((my_char + i) % 256))
+    yield tb.completion.wait()
 
 
 @cocotb.test()
+@dump_on_failure
 def test_5_spurious(dut):
     """
     glitches in the input line don't trigger a character output
     """
     tb = uart_rx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
-    yield tb.reset_dut(10000)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
 
-    yield Timer(10000)
+    yield Timer(10 * CLK_PERIOD)
     yield RisingEdge(dut.clk)
 
     for i in range(10):
         tb.dut.i_rx <= 0
         yield Timer(i)
         tb.dut.i_rx <= 1
-        yield Timer(2000000)
-        
+        yield tb.completion.wait()
+
+
+@cocotb.test()
+@dump_on_failure
+def test_6_stress(dut):
+    """
+    seeded constrained random bytes, gaps, glitches, breaks and resets.
+    UART_SEED picks the seed and UART_STRESS_BYTES the most bytes that go
+    out; it stops sooner once UART_COVERAGE of the coverage is reached
+    """
+    tb = uart_rx_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    stimulus = Stimulus(int(dut.BAUD))
+    stress = RxStress(tb.rx_drv, tb.reset_dut, tb.rx_model, tb.rx_coverage)
+    shard = Shard()
+    shard.start("uart_rx-test_6_stress")
+    with stimulus.reporting(dut._log):
+        yield stress.run(stimulus.rx())
+        yield tb.completion.wait()
+    shard.done(tb.rx_drv.frames, seed=stimulus.seed)
+    dut._log.info("stress events: %r", dict(stress.counts))
+    dut._log.info("scoreboard: %r", tb.scoreboard.stats())
+    dut._log.info("coverage:\n%s", tb.coverage.report())
+    tb.coverage.save()
+
+
+@cocotb.test()
+@dump_on_failure
+def test_7_clock_offset(dut):
+    """
+    the far end's clock 2% fast, then 2% slow, with jitter on every edge.
+    frames half a bit apart all still come through
+    """
+    tb = uart_rx_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    tb.rx_drv.gap = 0.5
+    tb.rx_drv.jitter = 0.02
+    for ppm in (-20000, 20000):
+        tb.rx_drv.ppm = ppm
+        yield tb.rx_drv.send(bytes(range(256)))
+        yield tb.completion.wait()
+
+
+@cocotb.test()
+@dump_on_failure
+def test_8_shard_record(dut):
+    """
+    two shards' records of a stream, one after the other in the same file,
+    read back the way tools/stress.py and tools/bench.py read them
+    """
+    tb = uart_rx_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    try:
+        for index in range(2):
+            shard = Shard("%d/2" % index)
+            start, stop = shard.range(8)
+            shard.start("uart_rx-test_8_shard_record", output=path)
+            yield tb.rx_drv.send(bytes(range(start, stop)))
+            yield tb.completion.wait()
+            shard.done(stop - start, seed=index)
+        measures = read_measures(path)
+    finally:
+        os.remove(path)
+    found = [(m["name"], m["shard"], m["shards"], m["frames"], m["seed"]) for m in measures]
+    if found != [("uart_rx-test_8_shard_record", i, 2, 4, i) for i in range(2)]:
+        raise TestFailure("read back %r" % found)
+
+
+@cocotb.test()
+@dump_on_failure
+def test_9_scoreboard_depth(dut):
+    """
+    a scoreboard only a few frames deep: bytes up to its depth are checked
+    as usual, one more expected without output fails the test
+    """
+    depth = 4
+    tb = uart_rx_tb(dut, depth)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    tb.rx_drv.append(bytes(range(depth)))
+    yield tb.completion.wait()
+    if tb.scoreboard.max_depth != depth or tb.scoreboard.matched != depth:
+        raise TestFailure("%r, expected %d deep and matched" % (tb.scoreboard.stats(), depth))
+    try:
+        tb.output_expected.extend(range(depth + 1))
+    except TestFailure:
+        tb.output_expected.clear()
+        return
+    raise TestFailure("%d bytes expected on a scoreboard %d deep" % (depth + 1, depth))
@@ -0,0 +1,20 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from uart_verif.bench import BYTES, Measure, pattern
+from test_uart_tx import CLK_PERIOD, uart_tx_tb
+
+@cocotb.test()
+def bench_tx_stream(dut):
+    """
+    BYTES bytes out of uart_tx as fast as it takes them, every frame checked
+    """
+    tb = uart_tx_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(dut.rstn, 10 * CLK_PERIOD)
+    yield RisingEdge(dut.clk)
+
+    measure = Measure("uart_tx")
+    yield tb.input_drv.send(pattern(BYTES))
+    yield tb.completion.wait()
+    measure.done(frames=BYTES)
@@ -1,142 +1,63 @@
-import logging
 import cocotb
-from cocotb.triggers import Timer, RisingEdge
+from cocotb.triggers import FallingEdge, Timer, RisingEdge
 from cocotb.result import TestFailure
+from uart_verif.completion import Completion
+from uart_verif.coverage import Coverage, TxCoverage
+from uart_verif.drivers import UartTxDriver
+from uart_verif.trace import dump_on_failure
+from uart_verif.model import UartModel
+from uart_verif.monitors import UartTxIMonitor, UartTxOMonitor
+from uart_verif.scoreboard import UartScoreboard
+from uart_verif.shard import Shard
+from uart_verif.stimulus import Stimulus, TxStress
 from cocotb.clock import Clock
-from cocotb.monitors import BusMonitor
-from cocotb.drivers import BusDriver
-from cocotb.scoreboard import Scoreboard
 from cocotb.utils import get_sim_time
-from cocotb.binary import BinaryValue
-
-class UartTxMonitor(BusMonitor):
-    def __init__(self, entity, name, clock, baud_rate, trigger_transmit_state, reset=None, reset_n=None, callback=None, event=None, bus_seperator="_"):
-        BusMonitor.__init__(self, entity, name, clock, reset, reset_n, callback, event, bus_seperator)
-        self.tts = trigger_transmit_state
-        self.last_transaction = None
-        self.baud_count = 0
-        self.baud_rate = baud_rate
-        self.transmitting = False
-        self.bits = 0
-        self.start_data = 0
-        
-    @cocotb.coroutine
-    def _monitor_recv(self):
-        yield Timer(1)
-        while True:
-            yield RisingEdge(self.clock)
-            if self.transmitting: 
-                self.baud_count = (self.baud_count + 1) % self.baud_rate
-            transaction = dict(self.bus.capture())
-            if self.in_reset: 
-                for x,y in transaction.items():
-                    self.log.debug("reset time %s -  %s : %s" %(get_sim_time("ns"),x,y))
-                self._recv(transaction)
-                self.baud_count = self.baud_rate -1
-                self.transmitting = False
-                self.bits = 0
-            elif self.tts(self,transaction):
-                self.transmitting = True
-                self.bits = 0
-                if 'data' in transaction:
-                    self.start_data = transaction['data']
-                self.baud_count = self.baud_rate / 2
-                for x,y in transaction.items():
-                    self.log.debug("start time %s -  %s : %s" %(get_sim_time("ns"),x,y))
-                self.last_transaction = transaction
-            elif self.baud_count == 0 and self.transmitting:
-                for x,y in transaction.items():
-                    self.log.debug("baud  time %s -  %s : %s" %(get_sim_time("ns"),x,y))
-                self._recv(transaction)
-                self.bits = self.bits + 1
-                if self.bits == 10:
-                    self.transmitting = False
-            self.last_transaction = transaction
-            
-class UartTxOMonitor(UartTxMonitor):
-    _signals = [ "tx", "ready"]
-
-    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None, event=None, bus_seperator="_"):
-        #looking for tx going down as a start of baud rate checks for character duration
-        def trigger_transmit_state(self,transaction):
-            return self.last_transaction != transaction and not self.transmitting and transaction['tx'] == 0
-        UartTxMonitor.__init__(self, entity, name, clock, baud_rate, trigger_transmit_state, reset, reset_n, callback, event, bus_seperator)
-
-        
-class UartTxIMonitor(UartTxMonitor):
-    _signals = [ "start", "data" ]
 
+# clk period in sim steps (ps). everything that depends on the uart's rate is
+# timed in bit periods (tb.bit_time) instead, so the tests hold at any BAUD.
+CLK_PERIOD = 1000
 
-    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None, event=None, bus_seperator="_"):
-        #looking for start set high as start of baud rate checks for character duration.
-        def trigger_transmit_state(self, transaction):
-            return not self.transmitting and transaction['start'] == 1
-        UartTxMonitor.__init__(self, entity, name, clock, baud_rate, trigger_transmit_state, reset, reset_n, callback, event, bus_seperator)
-        
-class UartTxDriver(BusDriver):
-    _signals = [ "start", "data"]
-    def __init__(self, entity, name, clock):
-        BusDriver.__init__(self, entity, name, clock)
-        self.bus.start.setimmediatevalue(0)
-        self.bus.data.setimmediatevalue(0)
-            
 class uart_tx_tb(object):
     def __init__(self, dut):
         self.dut = dut
+        self.bit_time = int(self.dut.BAUD) * CLK_PERIOD
         self.output_mon = UartTxOMonitor(dut, "o", dut.clk, int(self.dut.BAUD), reset_n=dut.rstn)
         self.input_mon = UartTxIMonitor(dut, "i", dut.clk, int(self.dut.BAUD), reset_n=dut.rstn, callback = self.tx_model)
-        self.input_drv = UartTxDriver(dut, "i", dut.clk ) #initializer only
-        self.etx = BinaryValue(1)
-        self.eready = BinaryValue(0)
-        self.output_expected = [{'tx':self.etx,'ready':self.eready}] #i don't think this should be necessary... 
-        self.scoreboard = Scoreboard(dut)
-
-        #self.output_mon.log.setLevel(logging.DEBUG)
+        self.input_drv = UartTxDriver(dut, "i", dut.clk, dut.o_ready)
+        self.model = UartModel()
+        self.scoreboard = UartScoreboard(dut)
         
-        #scoreboard is where results are checked. On each transaction of the output_mon, it'll compare against the
-        #next transaction in the list output_expected. Output_expected gets updated by the tx_model. tx_model is the
-        #callback function of the input monitor. So the expected output gets appended to when the input changes.
-        # its not obvious if on the same simulation cycle you can force the tx_model to get called before the
-        # scoreboard gets called on 
-        self.scoreboard.add_interface(self.output_mon, self.output_expected)
-        self.baud_rate = int(self.dut.BAUD) -1
-        self.baud_count = 0
-        self.shifter = 0
+        #scoreboard is where results are checked. On each frame the output_mon recovers, it'll compare against the
+        #next frame queued in output_expected. Output_expected gets updated by the tx_model. tx_model is the
+        #callback function of the input monitor, which reports each byte the dut takes, so the expected frame is
+        #always in place before the dut finishes sending it.
+        self.output_expected = self.scoreboard.add_interface(self.output_mon)
+
+        #tests finish with completion.wait() rather than sleeping: it returns
+        #once the dut is ready again with no frame going out, and the scoreboard
+        #has seen every frame it expected. it times things in ns.
+        self.completion = Completion(self.scoreboard, self.bit_time // 1000)
+        self.completion.add_driver(self.input_drv)
+        self.completion.add_idle("o_ready", lambda: self.dut.o_ready.value.integer == 1)
+        self.completion.add_idle("o_tx", lambda: not self.output_mon.transmitting)
+
+        #functional coverage, sampled from the input monitor and as reset goes low.
+        self.coverage = Coverage()
+        self.tx_coverage = TxCoverage(self.coverage, self.bit_time, dut.i_start, dut.o_ready)
+        self.input_mon.add_callback(self.tx_coverage.taken)
         
-    def tx_model(self, transaction):
-        # shift data (transaction second field) out 1 bit at a time
-        # at the baud rate
-        # adding start and stop bits to the expected values. 
-        if self.input_mon.transmitting: 
-            #print ("tx model call -- character %d:%d" % (self.input_mon.bits,len(self.output_expected)))
-            #print (self.output_expected)
-            if self.input_mon.bits == 0:
-                self.output_expected.pop() #ugh. are we putting in expectations for this cycle, or next?
-                self.etx<=0
-                self.eready<=0
-                self.output_expected.append({'tx':self.etx,'ready':self.eready}) #start bit
-                self.shifter = self.input_mon.start_data 
-                #print ("transaction - %s,%s" %(transaction[0],transaction[1]))
-            if self.input_mon.bits < 8:
-                self.output_expected.append({'tx':self.shifter % 2,'ready':0})
-                self.shifter = self.shifter >> 1
-            else: 
-                self.output_expected.append({'tx':1,'ready':0}) #stop bit
-        else:
-            #print ("tx model call -- idle :%d" % len(self.output_expected))
-            if self.input_mon.in_reset:
-                self.etx<=1
-                self.eready<=0
-                self.output_expected.append({'tx':self.etx,'ready':self.eready})
-            else:
-                self.etx<=1
-                self.eready<=1
-                self.output_expected.append({'tx':self.etx,'ready':self.eready})
+    def tx_model(self, data):
+        # the frame, start and stop bits included, that the dut should send for data
+        self.output_expected.extend(self.model.tx_expected([data]))
         
     @cocotb.coroutine
     def reset_dut(self, reset, duration):
+        self.tx_coverage.reset()
         reset <= 0
+        self.scoreboard.flush()
         yield Timer(duration)
+        # between clock edges, as in uart_rx's testbench
+        yield FallingEdge(self.dut.clk)
         reset <= 1
         self.dut._log.info("reset complete")
 
@@ -147,78 +68,88 @@ class uart_tx_tb(object):
         self.dut.i_start <= 1
         yield RisingEdge(self.dut.clk)
         self.dut.i_start <= 0
-        self.dut._log.info("sent char %s" % char)
+        self.dut._log.info("sent char %s", char)
         
 @cocotb.test()
+@dump_on_failure
 def test_1_send_a_char(dut):
     """
     send a character
     """
     tb = uart_tx_tb(dut)
     tb.dut._log.info("running uarttx test")
-    cocotb.fork(Clock(dut.clk, 1000).start())
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
 
-    yield tb.reset_dut(dut.rstn, 10000)
+    yield tb.reset_dut(dut.rstn, 10 * CLK_PERIOD)
 
     yield RisingEdge(dut.clk)
-    yield Timer(10000)
+    yield Timer(10 * CLK_PERIOD)
     yield tb.set_char('k')
-    yield Timer(2000000)
+    yield tb.completion.wait()
 
 @cocotb.test()
+@dump_on_failure
 def test_2_ignore_ready(dut):
     """
     change data in middle of send, and it's ignored
     """
     tb = uart_tx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
 
-    yield tb.reset_dut(dut.rstn, 10000)
+    yield tb.reset_dut(dut.rstn, 10 * CLK_PERIOD)
 
-    yield Timer(10000)
+    yield Timer(10 * CLK_PERIOD)
     yield tb.set_char('K')
 
+    # keep poking start every half bit for most of the frame
     my_char = ord('O')
-    for i in range(15):
-        yield Timer(50000)
+    end = get_sim_time() + 8 * tb.bit_time
+    i = 0
+    while get_sim_time() < end:
+        yield Timer(tb.bit_time // 2)
         if dut.o_ready == 1:
             raise TestFailure("ready was active unexpectently. Check the baud rate, and update the test to know it. ")
         yield tb.set_char(chr(my_char + i))
-    yield Timer(2000000)
+        i = i + 1
+    yield tb.completion.wait()
 
 @cocotb.test()
+@dump_on_failure
 def test_3_send_in_reset(dut):
     """ 
     send a chararacter before ready, and it's ignored
     """
     tb = uart_tx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
 
-    cocotb.fork(tb.reset_dut(dut.rstn,20000))
+    cocotb.fork(tb.reset_dut(dut.rstn, 20 * CLK_PERIOD))
 
-    yield Timer(10000)
+    yield Timer(10 * CLK_PERIOD)
     if dut.o_ready == 1:
         raise TestFailure("ready was active unexpectently. Check the reset control. ")
 
     yield tb.set_char('a')
 
-    yield Timer(1000000)
+    yield tb.completion.wait()
 
 @cocotb.test()
+@dump_on_failure
 def test_4_send_chars_fast(dut):
     """
      send multiple character's fast
     """
     tb = uart_tx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
-    yield tb.reset_dut(dut.rstn, 10000)
-    yield Timer(10000)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(dut.rstn, 10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
     my_char = ord('C')
     for i in range(10):
         yield tb.set_char(chr(my_char + i))
         yield RisingEdge(dut.o_ready)
+    yield tb.completion.wait()
                        
 @cocotb.test()
+@dump_on_failure
 def test_5_start_ignores_ready(dut):
     """
     Normally, start would only be high for a cycle. But with weird input, 
@@ -227,14 +158,45 @@ def test_5_start_ignores_ready(dut):
     """
 
     tb = uart_tx_tb(dut)
-    cocotb.fork(Clock(dut.clk, 1000).start())
-    yield tb.reset_dut(dut.rstn, 10000)
-    yield Timer(10000)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(dut.rstn, 10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
     my_char = ord('c')
     for i in range(3):
         yield RisingEdge(dut.clk)
         dut.i_data <= my_char + i
         dut.i_start <= 1
-        dut._log.info("sent char %s" % chr(my_char+i))
+        dut._log.info("sent char %s", chr(my_char+i))
         
-        yield Timer(1055000)
+        # hold each byte a little longer than a frame
+        yield Timer(11 * tb.bit_time)
+    # let go of start, or the dut never goes idle
+    dut.i_start <= 0
+    yield tb.completion.wait()
+
+
+@cocotb.test()
+@dump_on_failure
+def test_6_stress(dut):
+    """
+    seeded constrained random bytes, gaps, starts while busy and resets.
+    UART_SEED picks the seed and UART_STRESS_BYTES the most bytes that go
+    in; it stops sooner once UART_COVERAGE of the coverage is reached
+    """
+    tb = uart_tx_tb(dut)
+    cocotb.fork(Clock(dut.clk, CLK_PERIOD).start())
+    yield tb.reset_dut(dut.rstn, 10 * CLK_PERIOD)
+    yield Timer(10 * CLK_PERIOD)
+
+    stimulus = Stimulus(int(dut.BAUD))
+    stress = TxStress(tb.input_drv, lambda duration: tb.reset_dut(dut.rstn, duration), tb.tx_coverage)
+    shard = Shard()
+    shard.start("uart_tx-test_6_stress")
+    with stimulus.reporting(dut._log):
+        yield stress.run(stimulus.tx())
+        yield tb.completion.wait()
+    shard.done(tb.input_drv.frames, seed=stimulus.seed)
+    dut._log.info("stress events: %r", dict(stress.counts))
+    dut._log.info("scoreboard: %r", tb.scoreboard.stats())
+    dut._log.info("coverage:\n%s", tb.coverage.report())
+    tb.coverage.save()
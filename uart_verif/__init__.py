@@ -0,0 +1,11 @@
+"""
+Shared verification components for the uart testbenches.
+
+The test directories put the top of the repo on PYTHONPATH (see their
+Makefiles), so testbenches import from here with e.g.
+``from uart_verif.trace import dump_on_failure``.
+"""
+
+# with UART_PROFILE set this patches cocotb, which has to happen before a
+# testbench builds its first coroutine
+from uart_verif import profile  # noqa: F401
@@ -0,0 +1,67 @@
+"""
+Benchmark measurements, taken inside the simulation.
+
+The bench_*.py modules in the test directories run fixed workloads on the
+usual testbenches and time them with a Measure. Each result is appended
+as a line of JSON to UART_BENCH_FILE (bench.jsonl where the simulation
+runs), which tools/bench.py and tools/stress.py read back with read().
+UART_BENCH_BYTES sets the size of the uart workloads, and
+UART_BENCH_CYCLES the length of the div one.
+"""
+import json
+import os
+import resource
+import time
+
+import cocotb
+from cocotb.utils import get_sim_time
+
+BYTES = int(os.environ.get("UART_BENCH_BYTES", "10000"))
+CYCLES = int(os.environ.get("UART_BENCH_CYCLES", "1000000"))
+OUTPUT = os.environ.get("UART_BENCH_FILE", "bench.jsonl")
+
+
+def pattern(count):
+    """ count bytes that go through every byte value """
+    return bytes((i * 37 + 11) % 256 for i in range(count))
+
+
+class Measure(object):
+    """ wall and sim time from now until done(), appended to output; clk_period is in ns """
+    def __init__(self, name, clk_period=1.0, output=OUTPUT):
+        self.name = name
+        self.clk_period = clk_period
+        self.output = output
+        self.sim_start = get_sim_time("ns")
+        self.wall_start = time.time()
+
+    def done(self, frames=0, **extra):
+        """ record the measurement, along with any extra figures the workload has """
+        wall = time.time() - self.wall_start
+        sim = get_sim_time("ns") - self.sim_start
+        cycles = sim / self.clk_period
+        result = {
+            "name": self.name,
+            "wall_s": wall,
+            "sim_ns": sim,
+            "cycles": cycles,
+            "cycles_per_s": cycles / wall if wall else 0.0,
+            "frames": frames,
+            "frames_per_s": frames / wall if wall else 0.0,
+            # of the whole simulator process so far, in KB on linux
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        result.update(extra)
+        with open(self.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        cocotb.log.info("%s: %.1f s wall, %d cycles (%.0f/s), %d frames (%.1f/s)",
+                        self.name, wall, cycles, result["cycles_per_s"], frames, result["frames_per_s"])
+        return result
+
+
+def read(path=OUTPUT):
+    """ the measurements recorded in path, a line of JSON each, oldest first """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,99 @@
+"""
+Ending tests when the testbench runs out of work, rather than after a
+fixed sleep.
+
+Completion.wait() returns once the drivers have nothing left to send,
+the dut is idle and the scoreboard has nothing outstanding. It checks
+once a bit period, so waiting costs a wakeup per bit rather than per
+clock, and gives up with a TestFailure after a timeout worked out from
+how much is still to come.
+"""
+import cocotb
+from cocotb.result import TestFailure
+from cocotb.triggers import Edge, Timer
+from cocotb.utils import get_sim_time
+
+
+class LineWatch(object):
+    """ the time of the last edge on a serial line, kept without polling it """
+    def __init__(self, line):
+        self.line = line
+        self.last_edge = get_sim_time("ns")
+        cocotb.fork(self._watch())
+
+    @cocotb.coroutine
+    def _watch(self):
+        while True:
+            yield Edge(self.line)
+            self.last_edge = get_sim_time("ns")
+
+    def quiet_for(self, duration):
+        """ true if the line has sat high for at least duration ns """
+        return self.line.value.integer == 1 and get_sim_time("ns") - self.last_edge >= duration
+
+
+class Completion(object):
+    """
+    work out when a testbench is done. bit_time is a bit period in ns;
+    margin is how many frame times of slack the timeout allows on top of
+    the frames still expected or queued.
+    """
+    def __init__(self, scoreboard, bit_time, margin=4):
+        self.scoreboard = scoreboard
+        self.bit_time = bit_time
+        self.frame_time = 10 * bit_time
+        self.margin = margin
+        self.drivers = []
+        self.checks = []
+
+    def add_driver(self, driver):
+        """ wait for driver (with idle and queued()) to run dry """
+        self.drivers.append(driver)
+
+    def add_line(self, line):
+        """
+        wait for an input line to sit high for a frame and a bit, long
+        enough for the dut to finish a frame or throw away a glitch
+        """
+        watch = LineWatch(line)
+        self.add_idle("%s idle" % line._name, lambda: watch.quiet_for(self.frame_time + self.bit_time))
+
+    def add_idle(self, name, check):
+        """ wait for check() to be true """
+        self.checks.append((name, check))
+
+    def waiting(self):
+        """ descriptions of whatever isn't done yet """
+        waiting = ["%s sending" % type(driver).__name__ for driver in self.drivers if not driver.idle]
+        if self.scoreboard.outstanding:
+            waiting.append("%d expected transactions" % self.scoreboard.outstanding)
+        waiting.extend(name for name, check in self.checks if not check())
+        return waiting
+
+    def timeout(self):
+        """ ns to allow for what's outstanding and queued to come out """
+        frames = self.scoreboard.outstanding + sum(driver.queued() for driver in self.drivers)
+        return (frames + self.margin) * self.frame_time
+
+    @cocotb.coroutine
+    def wait(self, timeout=None):
+        """
+        return once everything is done, or fail after timeout ns. without a
+        timeout, it's worked out as things go: it's pushed back while a
+        driver is still busy, since a driver makes its own progress.
+        """
+        start = get_sim_time("ns")
+        deadline = start + (self.timeout() if timeout is None else timeout)
+        while True:
+            # let whatever the test just did register before checking
+            yield Timer(self.bit_time, units="ns")
+            waiting = self.waiting()
+            if not waiting:
+                break
+            now = get_sim_time("ns")
+            if timeout is None and any(driver.busy for driver in self.drivers):
+                deadline = max(deadline, now + self.timeout())
+            if now >= deadline:
+                raise TestFailure("testbench still waiting on %s after %d ns"
+                                  % (", ".join(waiting), now - start))
+        self.scoreboard.log.debug("done after %d ns", get_sim_time("ns") - start)
@@ -0,0 +1,182 @@
+"""
+Functional coverage for the uart testbenches.
+
+A Coverage is a set of named groups of bins, each a fixed size numpy
+bool array, so sampling is one index into an array. The samplers hang
+off the testbench's monitors and stress runners and fill in:
+- byte, every value received or taken to send
+- gap, the idle line between frames, bucketed in bit periods (GAPS)
+- reset (rx), rstn going low in each bit of a frame coming in
+- glitch (rx), glitch widths, under a clock then up to half a bit
+- busy_start (tx), start going high in each bit of a frame going out,
+  with ready low
+- reset (tx), rstn going low in each bit of a frame going out
+
+A stress run stops once every group has at least UART_COVERAGE of its
+bins hit (a fraction, default 1; 0 runs the whole UART_STRESS_BYTES),
+and saves its coverage to UART_COVERAGE_FILE (coverage.json). The file
+maps each group to {"size": bins, "hits": hex}, hits being a bitmap
+with bin i in bit i, so shards merge by or-ing them together, which is
+what tools/stress.py does.
+"""
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import cocotb
+from cocotb.triggers import ReadOnly, RisingEdge
+from cocotb.utils import get_sim_time
+
+TARGET = float(os.environ.get("UART_COVERAGE", "1"))
+FILE = os.environ.get("UART_COVERAGE_FILE", "coverage.json")
+
+# lower edges of the gap bins, in bit periods; the first bin is back to back
+GAPS = (0, 0.5, 1, 2, 4, 8)
+# start, 8 data bits, stop
+BITS = 10
+# one bin for glitches under a clock, the rest split up to half a bit
+GLITCHES = 8
+
+
+def _bucket(edges, value):
+    i = len(edges) - 1
+    while value < edges[i] and i > 0:
+        i -= 1
+    return i
+
+
+class Coverage(object):
+    """ named groups of bins, and how many of each have been hit """
+    def __init__(self):
+        self.groups = OrderedDict()
+
+    def add(self, name, size):
+        """ a new group of size bins; hit bin i with group[i] = True """
+        self.groups[name] = np.zeros(size, dtype=bool)
+        return self.groups[name]
+
+    def fractions(self):
+        return OrderedDict((name, np.count_nonzero(bins) / len(bins))
+                           for name, bins in self.groups.items())
+
+    def fraction(self):
+        """ the least covered group's fraction of bins hit """
+        return min(self.fractions().values()) if self.groups else 0.0
+
+    def reached(self, target=None):
+        target = TARGET if target is None else target
+        return target > 0 and self.fraction() >= target
+
+    def report(self):
+        lines = []
+        for name, bins in self.groups.items():
+            missing = np.flatnonzero(~bins)
+            line = "%-12s %4d/%d" % (name, np.count_nonzero(bins), len(bins))
+            if 0 < len(missing) <= 16:
+                line += " missing %s" % ", ".join(str(i) for i in missing)
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_json(self):
+        return OrderedDict((name, {"size": len(bins),
+                                   "hits": "%x" % sum(1 << int(i) for i in np.flatnonzero(bins))})
+                           for name, bins in self.groups.items())
+
+    def save(self, path=None):
+        with open(FILE if path is None else path, "w") as f:
+            json.dump(self.to_json(), f, indent=1)
+
+
+class RxCoverage(object):
+    """
+    sample a uart receiver. received() is a callback for the monitor of
+    its output; the stress runner calls reset() and glitch(). bit_time is
+    a bit period in sim steps and baud the dut's clocks per bit.
+    """
+    def __init__(self, coverage, bit_time, baud, prefix=""):
+        self.coverage = coverage
+        self.bit_time = bit_time
+        self.baud = baud
+        self.byte = coverage.add(prefix + "byte", 256)
+        self.gap = coverage.add(prefix + "gap", len(GAPS))
+        self.resets = coverage.add(prefix + "reset", BITS)
+        self.glitches = coverage.add(prefix + "glitch", GLITCHES)
+        self.last = None
+
+    def received(self, data):
+        # a byte comes out the same time into each frame, so the time
+        # between two less a frame is the idle line between them
+        now = get_sim_time()
+        self.byte[data] = True
+        if self.last is not None:
+            self.gap[_bucket(GAPS, (now - self.last) / self.bit_time - 10)] = True
+        self.last = now
+
+    def reset(self, bit):
+        """ rstn went low in bit of the frame coming in """
+        self.resets[min(bit, BITS - 1)] = True
+        self.last = None
+
+    def glitch(self, width):
+        """ a glitch width clocks wide """
+        if width < 1:
+            self.glitches[0] = True
+        else:
+            half = max(1, self.baud // 2)
+            self.glitches[1 + min(GLITCHES - 2, int((width - 1) * (GLITCHES - 1) // half))] = True
+
+    def done(self):
+        return self.coverage.reached()
+
+
+class TxCoverage(object):
+    """
+    sample a uart transmitter. taken() is a callback for the monitor of
+    the bytes it takes; reset() is called as rstn goes low. start and
+    ready are its start input and ready output, watched here for starts
+    while it's busy.
+    """
+    def __init__(self, coverage, bit_time, start, ready, prefix=""):
+        self.coverage = coverage
+        self.bit_time = bit_time
+        self.start = start
+        self.ready = ready
+        self.byte = coverage.add(prefix + "byte", 256)
+        self.gap = coverage.add(prefix + "gap", len(GAPS))
+        self.busy_starts = coverage.add(prefix + "busy_start", BITS)
+        self.resets = coverage.add(prefix + "reset", BITS)
+        self.last = None
+        cocotb.fork(self._starts())
+
+    def _bit(self):
+        # the bit of the frame going out, or None with none going out
+        if self.last is None or self.ready.value.integer != 0:
+            return None
+        return min(int((get_sim_time() - self.last) // self.bit_time), BITS - 1)
+
+    @cocotb.coroutine
+    def _starts(self):
+        while True:
+            yield RisingEdge(self.start)
+            yield ReadOnly()
+            bit = self._bit()
+            if bit is not None:
+                self.busy_starts[bit] = True
+
+    def taken(self, data):
+        now = get_sim_time()
+        self.byte[data] = True
+        if self.last is not None:
+            self.gap[_bucket(GAPS, (now - self.last) / self.bit_time - 10)] = True
+        self.last = now
+
+    def reset(self):
+        bit = self._bit()
+        if bit is not None:
+            self.resets[bit] = True
+        self.last = None
+
+    def done(self):
+        return self.coverage.reached()
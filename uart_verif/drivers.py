@@ -0,0 +1,228 @@
+"""
+Drivers for the uart testbenches.
+"""
+import itertools
+import random
+import time
+
+import cocotb
+from cocotb.drivers import BusDriver, Driver
+from cocotb.triggers import ReadOnly, RisingEdge, Timer
+from cocotb.utils import get_sim_time
+
+from uart_verif import profile
+
+
+def frame(byte):
+    """ the 10 bit line frame for byte, start bit in the lsb """
+    return (byte << 1) | 0x200
+
+
+FRAMES = [frame(byte) for byte in range(256)]
+
+
+def runs(frame, bits=10):
+    """ split a frame into [level, bit count] runs of the same level, lsb first """
+    result = []
+    for i in range(bits):
+        level = (frame >> i) & 1
+        if result and result[-1][0] == level:
+            result[-1][1] += 1
+        else:
+            result.append([level, 1])
+    return result
+
+
+RUNS = [runs(f) for f in FRAMES]
+
+
+class UartRxDriver(Driver):
+    """
+    drive 8N1 frames onto the rx line of a uart.
+
+    a transaction is bytes, a bytearray, a memoryview or any other iterable
+    of byte values (a generator works too), so a whole stream goes through
+    one append() or send() rather than a coroutine per character. frames go
+    out back to back with gap bit periods of idle line between them, and the
+    driver only wakes up when the line changes level.
+
+    if given, model is called with each block of up to BLOCK bytes just
+    before it goes out, so a reference model can set up its expectations a
+    block at a time without holding on to the whole stream.
+
+    ppm and jitter model a far end whose clock isn't the dut's: its bits
+    are ppm parts per million longer than BAUD clocks (shorter if
+    negative), and each edge lands up to jitter of a bit either side of
+    where it should, drawn from a generator seeded with seed. either one
+    puts the edges at sim times worked out as they go, rather than on
+    clock edges, so bit periods needn't be whole clocks.
+
+    frames, sim_time (ns) and wall_time (s) count what has been driven so far.
+    idle is true once everything sent or appended has gone out.
+    """
+    BLOCK = 4096
+
+    def __init__(self, rx, clock, baud, gap=0, model=None, ppm=0, jitter=0.0, seed=None):
+        self.rx = rx
+        self.clock = clock
+        self.baud = baud
+        self.gap = gap
+        self.ppm = ppm
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.model = profile.wrap(model)
+        self.clk_period = 0
+        self.frames = 0
+        self.sim_time = 0
+        self.wall_time = 0.0
+        self.busy = False
+        self._runs = None
+        self._runs_gap = None
+        self.rx.setimmediatevalue(1)
+        Driver.__init__(self)
+
+    @property
+    def idle(self):
+        return not self.busy and not self._sendQ
+
+    def queued(self):
+        """ bytes waiting to go out, not counting any being driven now """
+        # the transaction leads each queue entry; what follows it differs
+        # between cocotb versions
+        return sum(len(entry[0]) for entry in self._sendQ if hasattr(entry[0], "__len__"))
+
+    def _build_runs(self):
+        # one list of (level, sim steps) per byte value, with the idle gap
+        # folded into the stop bit so it costs nothing extra to drive
+        bit = self.baud * self.clk_period
+        gap = int(self.gap * bit)
+        self._runs = []
+        for byte_runs in RUNS:
+            frame_runs = [(level, count * bit) for level, count in byte_runs]
+            level, steps = frame_runs[-1]
+            frame_runs[-1] = (level, steps + gap)
+            self._runs.append(frame_runs)
+        self._runs_gap = self.gap
+
+    def _blocks(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            view = memoryview(data)
+            if view.format != 'B':
+                view = view.cast('B')
+            for i in range(0, len(view), self.BLOCK):
+                yield view[i:i + self.BLOCK]
+        else:
+            data = iter(data)
+            while True:
+                block = bytes(itertools.islice(data, self.BLOCK))
+                if not block:
+                    break
+                yield block
+
+    @cocotb.coroutine
+    def _driver_send(self, transaction, sync=True):
+        self.busy = True
+        if self.clk_period == 0:
+            yield RisingEdge(self.clock)
+            edge = get_sim_time()
+            yield RisingEdge(self.clock)
+            self.clk_period = get_sim_time() - edge
+        elif sync:
+            yield RisingEdge(self.clock)
+        if self._runs_gap != self.gap:
+            self._build_runs()
+        skewed = self.ppm != 0 or self.jitter != 0
+        rx = self.rx
+        table = self._runs
+        frames = 0
+        start = get_sim_time("ns")
+        wall = time.time()
+        for block in self._blocks(transaction):
+            if self.model is not None:
+                self.model(block)
+            if skewed:
+                yield self._send_skewed(block)
+            else:
+                for byte in block:
+                    for level, steps in table[byte]:
+                        rx <= level
+                        yield Timer(steps)
+            frames += len(block)
+        self.frames += frames
+        self.sim_time += get_sim_time("ns") - start
+        self.wall_time += time.time() - wall
+        self.busy = False
+        self.log.debug("drove %d frames in %d ns", frames, get_sim_time("ns") - start)
+
+    @cocotb.coroutine
+    def _send_skewed(self, block):
+        # each edge is placed from where it ideally falls, so rounding to
+        # whole sim steps and jitter don't build up over a stream
+        rx = self.rx
+        bit = self.baud * self.clk_period * (1 + self.ppm / 1e6)
+        jitter = self.jitter * bit
+        uniform = self.random.uniform
+        gap = self.gap
+        ideal = 0.0
+        now = 0
+        for byte in block:
+            frame_runs = RUNS[byte]
+            last = len(frame_runs) - 1
+            for i, (level, count) in enumerate(frame_runs):
+                rx <= level
+                ideal += (count + gap if i == last else count) * bit
+                edge = ideal + uniform(-jitter, jitter) if jitter else ideal
+                steps = max(1, int(round(edge - now)))
+                yield Timer(steps)
+                now += steps
+
+
+class UartTxDriver(BusDriver):
+    """
+    hand bytes to a uart transmitter through its start and data inputs.
+
+    a transaction is any iterable of byte values. each byte is put on data
+    with start high for one clock as soon as ready is high, so a stream
+    goes out back to back. subclasses with other signal names override
+    _signals, start first.
+    """
+    _signals = [ "start", "data"]
+
+    def __init__(self, entity, name, clock, ready):
+        BusDriver.__init__(self, entity, name, clock)
+        self.start = getattr(self.bus, self._signals[0])
+        self.data = getattr(self.bus, self._signals[1])
+        self.ready = ready
+        self.frames = 0
+        self.busy = False
+        self.start.setimmediatevalue(0)
+        self.data.setimmediatevalue(0)
+
+    @property
+    def idle(self):
+        return not self.busy and not self._sendQ
+
+    def queued(self):
+        """ bytes waiting to go out, not counting any being sent now """
+        return sum(len(entry[0]) for entry in self._sendQ if hasattr(entry[0], "__len__"))
+
+    @cocotb.coroutine
+    def _driver_send(self, transaction, sync=True):
+        self.busy = True
+        for byte in transaction:
+            # ready drops on the edge that takes start, so look once that's settled
+            yield ReadOnly()
+            if self.ready.value.integer != 1:
+                yield RisingEdge(self.ready)
+            yield RisingEdge(self.clock)
+            self.data <= byte
+            self.start <= 1
+            yield RisingEdge(self.clock)
+            self.start <= 0
+            self.frames += 1
+        self.busy = False
+
+
+class UartTopTxDriver(UartTxDriver):
+    """ the uart top level's transmitter inputs, i_tx_start and i_tx_data with name "i" """
+    _signals = ["tx_start", "tx_data"]
@@ -0,0 +1,135 @@
+"""
+Full-duplex loopback of the uart top level.
+
+Loopback ties o_tx to i_rx with a zero delay forwarder, so every byte
+the transmitter takes should come back out of the receiver about a frame
+later, while the next one is already going out. It checks them off in
+order and keeps:
+- bytes sent and received, and when the stream started and ended
+- dropped bytes, not back a frame and a bit after they were taken
+- corrupted bytes, back in time but different, and unexpected ones
+- the idle clocks between o_tx_ready rising and the next i_tx_start
+
+summary() works out sustained throughput in bytes per bit time from
+them; a uart sending back to back can't beat 1/10.
+"""
+from collections import deque
+
+import cocotb
+from cocotb.log import SimLog
+from cocotb.triggers import Edge, RisingEdge
+from cocotb.utils import get_sim_time
+
+
+class Loopback(object):
+    """
+    forward tx onto rx and check what comes back. bit_time is a bit period
+    in sim steps. sent() and received() are the callbacks for the monitors
+    of bytes going into the transmitter and coming out of the receiver.
+    """
+    def __init__(self, tx, rx, ready, start, clock, bit_time):
+        self.tx = tx
+        self.rx = rx
+        self.ready = ready
+        self.start = start
+        self.clock = clock
+        self.bit_time = bit_time
+        # from the transmitter taking a byte to the receiver putting it out
+        self.deadline = 11 * bit_time
+        self.log = SimLog("cocotb.loopback.%s" % tx._name)
+        self.pending = deque()
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.dropped = 0
+        self.corrupted = 0
+        self.unexpected = 0
+        self.first_sent = None
+        self.last_received = None
+        self.idle_clocks = 0
+        self.idle_gaps = 0
+        self.max_idle = 0
+        self.clk_period = 0
+        self.rx.setimmediatevalue(1)
+        cocotb.fork(self._forward())
+        cocotb.fork(self._idle())
+
+    @cocotb.coroutine
+    def _forward(self):
+        tx, rx = self.tx, self.rx
+        while True:
+            yield Edge(tx)
+            try:
+                rx <= tx.value.integer
+            except ValueError:
+                # x before the first clock; leave the line idling high
+                pass
+
+    @cocotb.coroutine
+    def _idle(self):
+        yield RisingEdge(self.clock)
+        edge = get_sim_time()
+        yield RisingEdge(self.clock)
+        self.clk_period = get_sim_time() - edge
+        while True:
+            yield RisingEdge(self.ready)
+            rose = get_sim_time()
+            if self.start.value.integer != 1:
+                yield RisingEdge(self.start)
+            clocks = (get_sim_time() - rose) // self.clk_period
+            self.idle_clocks += clocks
+            self.idle_gaps += 1
+            self.max_idle = max(self.max_idle, clocks)
+
+    def sent(self, data):
+        now = get_sim_time()
+        if self.first_sent is None:
+            self.first_sent = now
+        self.pending.append((data, now + self.deadline))
+        self.sent_bytes += 1
+
+    def _drop_overdue(self, now):
+        while self.pending and self.pending[0][1] < now:
+            data, _ = self.pending.popleft()
+            self.dropped += 1
+            self.log.error("0x%x never came back", data)
+
+    def received(self, data):
+        now = get_sim_time()
+        self.received_bytes += 1
+        self.last_received = now
+        self._drop_overdue(now)
+        if not self.pending:
+            self.unexpected += 1
+            self.log.error("received 0x%x but wasn't expecting anything", data)
+            return
+        expected, _ = self.pending.popleft()
+        if data != expected:
+            self.corrupted += 1
+            self.log.error("received 0x%x, sent 0x%x", data, expected)
+
+    def waiting(self):
+        """ true while a byte that's been sent could still come back """
+        now = get_sim_time()
+        self._drop_overdue(now)
+        return bool(self.pending)
+
+    @property
+    def errors(self):
+        return self.dropped + self.corrupted + self.unexpected
+
+    def summary(self):
+        elapsed = 0
+        if self.first_sent is not None and self.last_received is not None:
+            elapsed = self.last_received - self.first_sent
+        bits = elapsed / self.bit_time
+        good = self.received_bytes - self.corrupted - self.unexpected
+        return {
+            "sent": self.sent_bytes,
+            "received": self.received_bytes,
+            "dropped": self.dropped,
+            "corrupted": self.corrupted,
+            "unexpected": self.unexpected,
+            "bytes_per_bit": good / bits if bits else 0.0,
+            "idle_clocks_mean": self.idle_clocks / self.idle_gaps if self.idle_gaps else 0.0,
+            "idle_clocks_max": self.max_idle,
+        }
@@ -0,0 +1,67 @@
+"""
+Transaction level reference model of the uart.
+
+Rather than rebuilding frames bit by bit from monitor callbacks, the model
+takes a whole stream of bytes at once and works out what should come out of
+the dut in one vectorized pass over a 256 entry frame table.
+"""
+import numpy as np
+
+from uart_verif.drivers import FRAMES
+
+FRAME_LUT = np.array(FRAMES, dtype=np.uint16)
+SHIFTS = np.arange(10, dtype=np.uint16)
+WEIGHTS = 1 << np.arange(8, dtype=np.uint16)
+
+
+def as_array(data):
+    """ a stream of byte values (bytes-like or iterable) as a uint8 array """
+    try:
+        return np.frombuffer(data, dtype=np.uint8)
+    except TypeError:
+        return np.fromiter(data, dtype=np.uint8)
+
+
+def frame_bits(data):
+    """ the line bits of each byte's frame, one row per byte, start bit first """
+    return ((FRAME_LUT[as_array(data)][:, None] >> SHIFTS) & 1).astype(np.uint8)
+
+
+def decode(bits):
+    """
+    what uart_rx makes of frames sampled mid-bit (rows of 10 bits, start
+    first): the received bytes, plus masks of the rows that were breaks
+    (all zero) and framing errors (low stop bit, but not a break).
+    """
+    bits = np.asarray(bits, dtype=np.uint8).reshape(-1, 10)
+    stop = bits[:, 9] == 1
+    breaks = ~bits.any(axis=1)
+    data = bits[:, 1:9].dot(WEIGHTS).astype(np.uint8)
+    return data[stop], breaks, ~stop & ~breaks
+
+
+class UartModel(object):
+    """ expected outputs of uart_rx and uart_tx for whole byte streams """
+    def __init__(self):
+        self.frames = 0
+        self.breaks = 0
+        self.frame_errors = 0
+
+    def rx_expected(self, frames):
+        """
+        the bytes uart_rx should put out for a stream of line frames: byte
+        values to frame, or an array of sampled frame bits for anything
+        that isn't a clean frame.
+        """
+        bits = frames if isinstance(frames, np.ndarray) and frames.ndim == 2 else frame_bits(frames)
+        data, breaks, errors = decode(bits)
+        self.frames += len(bits)
+        self.breaks += int(breaks.sum())
+        self.frame_errors += int(errors.sum())
+        return data.tolist()
+
+    def tx_expected(self, data):
+        """ the 10 bit line frames uart_tx should send for data, start bit in the lsb """
+        frames = FRAME_LUT[as_array(data)]
+        self.frames += len(frames)
+        return frames.tolist()
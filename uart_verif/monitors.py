@@ -0,0 +1,294 @@
+"""
+Monitors for the uart testbenches.
+
+Every monitor reports plain ints rather than dicts of BinaryValues: a byte
+for the dut's parallel side, or a whole 10 bit frame, start bit in the
+lsb, for a serial line. Bus signals are looked up once, when the monitor
+is built, by their place in _signals, so a dut with other names only
+needs a subclass overriding _signals. Values are read straight into ints.
+Between characters the monitors sleep on an edge rather than waking up
+every clock.
+"""
+import cocotb
+from cocotb.monitors import BusMonitor, Monitor
+from cocotb.triggers import FallingEdge, ReadOnly, RisingEdge, Timer
+from cocotb.utils import get_sim_time
+
+from uart_verif import trace
+from uart_verif.trace import debug_enabled
+
+
+class UartRxMonitor(Monitor):
+    """
+    observe the rx line of a uart the way uart_rx does, reporting each
+    frame it samples, start bit in the lsb. a line held low (break) is
+    reported as all zero frames, one after another.
+    """
+    def __init__(self, rx, clock, baud, reset_n=None, callback=None, event=None):
+        self.clock = clock
+        self.rx = rx
+        self.baud = baud
+        self.receiving = False
+        self.reset_n = reset_n
+        self.clk_period = 0
+        self.trace = trace.active()
+        if self.trace is not None:
+            self.trace_rx = self.trace.signal(rx._name)
+        Monitor.__init__(self, callback, event)
+
+    def _wait(self, trigger):
+        # wake up on trigger, or early if we go into reset
+        if self.reset_n is None:
+            return trigger
+        return [trigger, FallingEdge(self.reset_n)]
+
+    def _in_reset(self):
+        return self.reset_n is not None and self.reset_n.value.integer == 0
+
+    @cocotb.coroutine
+    def _monitor_recv(self):
+        # sample once a bit period while a character's coming in, half a
+        # period in. in between characters sleep until rx falls.
+        yield Timer(1)
+        yield RisingEdge(self.clock)
+        edge = get_sim_time()
+        yield RisingEdge(self.clock)
+        self.clk_period = get_sim_time() - edge
+        half_bit = (self.baud // 2) * self.clk_period
+        bit = self.baud * self.clk_period
+        rx = self.rx
+        while True:
+            if self._in_reset():
+                self.receiving = False
+                yield RisingEdge(self.reset_n)
+                continue
+            # a line held low (break) starts another character straight away
+            if rx.value.integer != 0:
+                yield self._wait(FallingEdge(rx))
+                if self._in_reset():
+                    continue
+            # line up with the clock edge the dut registers the start bit on
+            yield RisingEdge(self.clock)
+            yield self._wait(Timer(half_bit))
+            if self._in_reset():
+                continue
+            if rx.value.integer != 0:
+                # rx went back up before the middle of the start bit, so it
+                # was a glitch, not a character
+                self.log.debug("glitch on rx, ignoring it")
+                continue
+            self.receiving = True
+            frame = 0
+            for i in range(1, 10):
+                yield self._wait(Timer(bit))
+                if self._in_reset():
+                    break
+                frame |= rx.value.integer << i
+            else:
+                if debug_enabled(self.log):
+                    self.log.debug("frame %s", bin(frame))
+                if self.trace is not None:
+                    self.trace.record(self.trace_rx, frame)
+                self._recv(frame)
+            self.receiving = False
+
+
+class UartBusMonitor(BusMonitor):
+    """ reset handling shared by the monitors of the dut's ports """
+    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None,
+                 event=None, bus_seperator="_"):
+        BusMonitor.__init__(self, entity, name, clock, reset, reset_n, callback, event, bus_seperator)
+        self.baud_rate = baud_rate
+        self.signals = [getattr(self.bus, signal) for signal in self._signals]
+        self.trace = trace.active()
+        if self.trace is not None:
+            self.trace_id = self.trace.signal("%s_%s" % (name, self._signals[self.TRACED]))
+
+    # which of _signals the trace names its records after
+    TRACED = 0
+
+    def _reset_edge(self):
+        if self._reset_n is not None:
+            return FallingEdge(self._reset_n)
+        if self._reset is not None:
+            return RisingEdge(self._reset)
+        return None
+
+    def _release_edge(self):
+        if self._reset_n is not None:
+            return RisingEdge(self._reset_n)
+        return FallingEdge(self._reset)
+
+    def _wait(self, trigger):
+        # wake up on trigger, or early if the bus goes into reset
+        reset = self._reset_edge()
+        if reset is None:
+            return trigger
+        return [trigger, reset]
+
+
+class UartRxOMonitor(UartBusMonitor):
+    """ report each byte uart_rx puts out: _signals are its valid strobe, then its data """
+    _signals = ["rcv", "data"]
+    TRACED = 1
+
+    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None,
+                 event=None, bus_seperator="_"):
+        UartBusMonitor.__init__(self, entity, name, clock, baud_rate, reset, reset_n, callback,
+                                event, bus_seperator)
+        self.valid, self.data = self.signals
+        self.receiving = False
+
+    @cocotb.coroutine
+    def _monitor_recv(self):
+        yield Timer(1) # gets us past x's on startup.
+        valid, data = self.valid, self.data
+        while True:
+            if self.in_reset:
+                # nothing comes out in reset, and the model drops anything
+                # sent while the dut is held there
+                yield self._release_edge()
+                continue
+            # the strobe is only high for a clock, so wait for it to rise and
+            # sample once the dut has settled
+            yield self._wait(RisingEdge(valid))
+            if self.in_reset:
+                continue
+            yield ReadOnly()
+            value = data.value.integer
+            if debug_enabled(self.log):
+                self.log.debug("got something: %s %s", self._signals[1], hex(value))
+            if self.trace is not None:
+                self.trace.record(self.trace_id, value)
+            self._recv(value)
+
+
+class UartTxMonitor(UartBusMonitor):
+    """
+    common start detection and bit timing for the uart_tx monitors. rather
+    than waking up on every clock, sleep until something starts a character
+    and let the subclass's _frame() time the rest of it.
+
+    subclasses define _start_edge(), the trigger for the edge that starts
+    a character, and _frame(), a coroutine that takes the character from
+    there, and may override _started() to check for a start already held.
+    """
+    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None,
+                 event=None, bus_seperator="_"):
+        UartBusMonitor.__init__(self, entity, name, clock, baud_rate, reset, reset_n, callback,
+                                event, bus_seperator)
+        self.clk_period = 0
+        self.bit_time = 0
+        self.transmitting = False
+
+    def _started(self):
+        # level check for a start that's already there
+        return False
+
+    @cocotb.coroutine
+    def _monitor_recv(self):
+        yield Timer(1)
+        yield RisingEdge(self.clock)
+        edge = get_sim_time()
+        yield RisingEdge(self.clock)
+        self.clk_period = get_sim_time() - edge
+        self.bit_time = self.baud_rate * self.clk_period
+        while True:
+            if self.in_reset:
+                self.transmitting = False
+                yield self._release_edge()
+                continue
+            if not self._started():
+                yield self._wait(self._start_edge())
+                if self.in_reset:
+                    continue
+            # line up with the clock edge the dut sees the start on. a reset
+            # that lands in between means the dut never takes it
+            yield RisingEdge(self.clock)
+            if self.in_reset:
+                continue
+            self.transmitting = True
+            yield self._frame()
+            self.transmitting = False
+
+
+class UartTxOMonitor(UartTxMonitor):
+    """
+    recover whole frames from the tx line, as 10 bit ints with the start
+    bit in the lsb. _signals are the line, then ready.
+    """
+    _signals = ["tx", "ready"]
+
+    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None,
+                 event=None, bus_seperator="_"):
+        UartTxMonitor.__init__(self, entity, name, clock, baud_rate, reset, reset_n, callback,
+                               event, bus_seperator)
+        self.tx = self.signals[0]
+
+    def _start_edge(self):
+        # looking for tx going down as the start of a character
+        return FallingEdge(self.tx)
+
+    @cocotb.coroutine
+    def _frame(self):
+        # sample in the middle of each bit, start bit first
+        tx = self.tx
+        frame = 0
+        yield self._wait(Timer((self.baud_rate // 2) * self.clk_period))
+        for i in range(10):
+            if self.in_reset:
+                return
+            frame |= tx.value.integer << i
+            if i < 9:
+                yield self._wait(Timer(self.bit_time))
+        if debug_enabled(self.log):
+            self.log.debug("frame %s", bin(frame))
+        if self.trace is not None:
+            self.trace.record(self.trace_id, frame)
+        self._recv(frame)
+
+
+class UartTxIMonitor(UartTxMonitor):
+    """ report each byte uart_tx takes to send. _signals are start, then data """
+    _signals = ["start", "data"]
+
+    def __init__(self, entity, name, clock, baud_rate, reset=None, reset_n=None, callback=None,
+                 event=None, bus_seperator="_"):
+        UartTxMonitor.__init__(self, entity, name, clock, baud_rate, reset, reset_n, callback,
+                               event, bus_seperator)
+        self.start, self.data = self.signals
+
+    def _started(self):
+        # start may just be held high, so check the level before waiting for an edge.
+        return self.start.value.integer == 1
+
+    def _start_edge(self):
+        return RisingEdge(self.start)
+
+    @cocotb.coroutine
+    def _frame(self):
+        data = self.data.value.integer
+        if debug_enabled(self.log):
+            self.log.debug("start - data %s", hex(data))
+        if self.trace is not None:
+            self.trace.record(self.trace_id, data)
+        self._recv(data)
+        # uart_tx only looks at start again once it's back in IDLE, 10 bit
+        # periods and 4 clocks after it took this one. wake up half a clock
+        # before that edge so the level check lands on it.
+        yield self._wait(Timer((10 * self.baud_rate + 3) * self.clk_period + self.clk_period // 2))
+
+
+# the uart top level's ports carry rx_/tx_ prefixes after the bus name, so
+# only the signal names change. a wrapper with a prefix per channel passes
+# it in the bus name, e.g. "ch0_o".
+class UartTopRxOMonitor(UartRxOMonitor):
+    _signals = ["rx_data_valid", "rx_data"]
+
+
+class UartTopTxOMonitor(UartTxOMonitor):
+    _signals = ["tx", "tx_ready"]
+
+
+class UartTopTxIMonitor(UartTxIMonitor):
+    _signals = ["tx_start", "tx_data"]
@@ -0,0 +1,182 @@
+"""
+Opt-in profiling of the testbench's Python.
+
+Set UART_PROFILE=1 (or to a path) and every cocotb coroutine, plus every
+monitor callback and driver model hook, is timed by component:
+- wall time spent in its own Python, not counting what it calls into
+- the number of times it was resumed (or called, for callbacks)
+- the number of simulator triggers it waited on
+
+At the end of the run a table ranked by that time goes to the log, and
+the time is written as folded stacks (profile.folded, or the path given,
+in microseconds) for flamegraph.pl or speedscope.
+
+Coroutines are caught by wrapping the generator every RunningCoroutine
+is built around, so the names are the functions' qualified names, e.g.
+UartTxOMonitor._frame or Clock.start. With UART_PROFILE unset nothing is
+patched and wrap() hands back what it was given.
+"""
+import atexit
+import functools
+import os
+import time
+from collections import defaultdict
+
+import cocotb
+from cocotb.triggers import Trigger
+
+SETTING = os.environ.get("UART_PROFILE", "")
+ENABLED = SETTING not in ("", "0")
+OUTPUT = SETTING if ENABLED and SETTING != "1" else "profile.folded"
+
+_clock = time.perf_counter
+_stats = {}
+_folded = defaultdict(float)
+# [stats, start, time spent in things it called]
+_stack = []
+_reported = False
+
+
+class Stats(object):
+    __slots__ = ("name", "own", "total", "resumes", "triggers")
+
+    def __init__(self, name):
+        self.name = name
+        self.own = 0.0
+        self.total = 0.0
+        self.resumes = 0
+        self.triggers = 0
+
+
+def stats(name):
+    found = _stats.get(name)
+    if found is None:
+        found = _stats[name] = Stats(name)
+    return found
+
+
+def _enter(component):
+    frame = [component, _clock(), 0.0]
+    _stack.append(frame)
+    return frame
+
+
+def _leave(frame):
+    elapsed = _clock() - frame[1]
+    path = ";".join(f[0].name for f in _stack)
+    _stack.pop()
+    component = frame[0]
+    component.total += elapsed
+    component.own += elapsed - frame[2]
+    component.resumes += 1
+    _folded[path] += elapsed - frame[2]
+    if _stack:
+        _stack[-1][2] += elapsed
+
+
+def _triggers(yielded):
+    if isinstance(yielded, Trigger):
+        return 1
+    if isinstance(yielded, list):
+        return sum(1 for trigger in yielded if isinstance(trigger, Trigger))
+    return 0
+
+
+def _profiled(component, gen):
+    # stands in for gen, passing everything through and timing each resumption
+    value = None
+    thrown = None
+    while True:
+        frame = _enter(component)
+        try:
+            if thrown is None:
+                yielded = gen.send(value)
+            else:
+                yielded = gen.throw(thrown)
+        except StopIteration as done:
+            _leave(frame)
+            return done.value
+        except BaseException:
+            _leave(frame)
+            raise
+        _leave(frame)
+        component.triggers += _triggers(yielded)
+        value = thrown = None
+        try:
+            value = yield yielded
+        except GeneratorExit:
+            gen.close()
+            raise
+        except BaseException as e:
+            thrown = e
+
+
+def wrap(fn, name=None):
+    """ fn, timed as a component of its own when profiling is on """
+    if not ENABLED or fn is None:
+        return fn
+    component = stats(name or getattr(fn, "__qualname__", repr(fn)))
+
+    @functools.wraps(fn)
+    def profiled(*args, **kwargs):
+        frame = _enter(component)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _leave(frame)
+    return profiled
+
+
+def report():
+    """ log the ranked table and write the folded stacks, once """
+    global _reported
+    if _reported or not _stats:
+        return
+    _reported = True
+    ranked = sorted(_stats.values(), key=lambda s: s.own, reverse=True)
+    python = sum(s.own for s in ranked) or 1.0
+    lines = ["%-50s %10s %10s %10s %10s %6s" % ("component", "own (ms)", "total (ms)",
+                                               "resumes", "triggers", "own %")]
+    for s in ranked:
+        lines.append("%-50s %10.1f %10.1f %10d %10d %5.1f%%" % (
+            s.name[-50:], s.own * 1e3, s.total * 1e3, s.resumes, s.triggers, 100 * s.own / python))
+    cocotb.log.info("testbench profile:\n%s", "\n".join(lines))
+    with open(OUTPUT, "w") as f:
+        for path, seconds in sorted(_folded.items()):
+            f.write("%s %d\n" % (path, round(seconds * 1e6)))
+    cocotb.log.info("folded stacks written to %s", OUTPUT)
+
+
+def install():
+    from cocotb import decorators, monitors
+
+    original_init = decorators.RunningCoroutine.__init__
+
+    def __init__(self, inst, parent):
+        name = getattr(inst, "__qualname__", getattr(inst, "__name__", "coroutine"))
+        proxy = _profiled(stats(name), inst)
+        if hasattr(inst, "__name__"):
+            proxy.__name__ = inst.__name__
+        original_init(self, proxy, parent)
+    decorators.RunningCoroutine.__init__ = __init__
+
+    original_add_callback = monitors.Monitor.add_callback
+
+    def add_callback(self, callback):
+        original_add_callback(self, wrap(callback))
+    monitors.Monitor.add_callback = add_callback
+
+    # the regression manager's tear down is the last thing to run for sure
+    # inside the simulator; atexit covers anything that skips it
+    from cocotb import regression
+    original_tear_down = getattr(regression.RegressionManager, "tear_down", None)
+    if original_tear_down is not None:
+        def tear_down(self):
+            report()
+            original_tear_down(self)
+        regression.RegressionManager.tear_down = tear_down
+    atexit.register(report)
+
+
+if ENABLED:
+    install()
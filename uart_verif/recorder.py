@@ -0,0 +1,232 @@
+"""
+Recording value changes for checking after the run.
+
+Rather than a monitor waking up every bit to rebuild frames as the test
+runs, a Recorder keeps the time and new value of every change on a few
+signals in preallocated arrays, and writes them to a file whenever one
+fills. The bytes the testbench drove in are recorded the same way, as
+the stimulus to check against. read() and check() decode and check the
+whole file afterwards, in bulk, with numpy: test_5_soak in uart/test
+calls them as it finishes, and tools/uart_decode.py from the command line.
+
+The file is:
+- RECORD_MAGIC
+- a little endian uint32 length, then that much JSON header, giving the
+  bit time in sim steps, the byte order, the names of the streams, and
+  which of them to check against which:
+  - lines, a serial line and the stimulus its frames should carry
+  - strobes, a valid strobe, its data and the stimulus the data should be
+- blocks, each a uint16 stream index and uint32 count (little endian),
+  then count uint64 sim times and count uint32 values in the header's
+  byte order
+"""
+import json
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+import cocotb
+from cocotb.triggers import Edge
+from cocotb.utils import get_sim_time
+
+RECORD_MAGIC = b"UARTREC1"
+# changes kept per stream before they're written out
+CHUNK = 1 << 16
+
+
+class Stream(object):
+    __slots__ = ("index", "times", "values", "count")
+
+    def __init__(self, index):
+        self.index = index
+        self.times = array('Q', [0]) * CHUNK
+        self.values = array('I', [0]) * CHUNK
+        self.count = 0
+
+
+class Recorder(object):
+    """
+    record to path. lines maps serial line handles to the name of the
+    stimulus their frames should match, and strobes is a list of (valid,
+    data, stimulus name). bit_time is a bit period in sim steps.
+    record() adds a value to a stimulus stream.
+    """
+    def __init__(self, path, bit_time, lines=None, strobes=()):
+        lines = lines or {}
+        self.path = path
+        self.file = open(path, "wb")
+        self.streams = {}
+        self.names = []
+        self.changes = 0
+        watched = []
+        for line, expected in lines.items():
+            watched.append(line)
+            self._stream(expected)
+        for valid, data, expected in strobes:
+            watched.extend((valid, data))
+            self._stream(expected)
+        for signal in watched:
+            self._stream(signal._name)
+        header = json.dumps({
+            "bit_time": bit_time,
+            "byteorder": sys.byteorder,
+            "streams": self.names,
+            "lines": dict((line._name, expected) for line, expected in lines.items()),
+            "strobes": [[valid._name, data._name, expected] for valid, data, expected in strobes],
+        }).encode()
+        self.file.write(RECORD_MAGIC + struct.pack("<I", len(header)) + header)
+        for signal in watched:
+            cocotb.fork(self._watch(signal, self.streams[signal._name]))
+
+    def _stream(self, name):
+        if name not in self.streams:
+            self.streams[name] = Stream(len(self.names))
+            self.names.append(name)
+        return self.streams[name]
+
+    def _flush(self, stream):
+        count = stream.count
+        if count and self.file is not None:
+            self.file.write(struct.pack("<HI", stream.index, count))
+            self.file.write(stream.times[:count].tobytes())
+            self.file.write(stream.values[:count].tobytes())
+            self.changes += count
+        stream.count = 0
+
+    def _append(self, stream, value):
+        i = stream.count
+        stream.times[i] = get_sim_time()
+        stream.values[i] = value
+        stream.count = i + 1
+        if stream.count == CHUNK:
+            self._flush(stream)
+
+    @cocotb.coroutine
+    def _watch(self, signal, stream):
+        append = self._append
+        while True:
+            yield Edge(signal)
+            try:
+                append(stream, signal.value.integer)
+            except ValueError:
+                # x or z, before reset
+                pass
+
+    def record(self, name, value):
+        self._append(self.streams[name], value)
+
+    def close(self):
+        """ write out what's left; changes after this aren't recorded """
+        if self.file is None:
+            return
+        for name in self.names:
+            self._flush(self.streams[name])
+        self.file.close()
+        self.file = None
+
+
+def read(path):
+    """ the header, and a name: (times, values) array pair for each stream """
+    with open(path, "rb") as f:
+        if f.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            raise ValueError("%s isn't a uart recording" % path)
+        length, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode())
+        order = "<" if header["byteorder"] == "little" else ">"
+        times = [[] for _ in header["streams"]]
+        values = [[] for _ in header["streams"]]
+        while True:
+            block = f.read(6)
+            if len(block) < 6:
+                break
+            index, count = struct.unpack("<HI", block)
+            times[index].append(np.frombuffer(f.read(8 * count), dtype=order + "u8").astype(np.int64))
+            values[index].append(np.frombuffer(f.read(4 * count), dtype=order + "u4").astype(np.int64))
+    streams = {}
+    for i, name in enumerate(header["streams"]):
+        if times[i]:
+            streams[name] = (np.concatenate(times[i]), np.concatenate(values[i]))
+        else:
+            streams[name] = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    return header, streams
+
+
+def value_at(times, values, at, before=1):
+    """ the value of a stream at each of the times in at, or before ahead of its first change """
+    index = np.searchsorted(times, at, side="right") - 1
+    return np.where(index >= 0, values[np.maximum(index, 0)], before)
+
+
+def decode_line(times, values, bit_time):
+    """
+    frames on a line idling high: (start times, bytes, framing error
+    mask, times of edges inside a frame that miss a bit boundary)
+    """
+    changed = np.flatnonzero(np.diff(np.concatenate(([1], values))))
+    times, values = times[changed], values[changed]
+    falls = times[values == 0]
+    # the next start can't fall before the middle of the stop bit, so
+    # from each falling edge, the one that could start the next frame
+    following = np.searchsorted(falls, falls + (19 * bit_time) // 2)
+    chosen = []
+    i = 0
+    while i < len(falls):
+        chosen.append(i)
+        i = following[i]
+    starts = falls[np.array(chosen, dtype=np.int64)]
+    middles = starts[:, None] + ((2 * np.arange(10) + 1) * bit_time) // 2
+    bits = value_at(times, values, middles)
+    data = (bits[:, 1:9] << np.arange(8)).sum(axis=1)
+    framing = (bits[:, 0] != 0) | (bits[:, 9] != 1)
+    frame = np.searchsorted(starts, times, side="right") - 1
+    offset = times - starts[np.maximum(frame, 0)]
+    inside = (frame >= 0) & (offset < 10 * bit_time)
+    skewed = times[inside & (offset % bit_time != 0)]
+    return starts, data, framing, skewed
+
+
+def strobed(valid, data):
+    """ (times, data) for each rising edge of a valid strobe """
+    vtimes, vvalues = valid
+    rises = vtimes[1:][(vvalues[1:] == 1) & (vvalues[:-1] == 0)]
+    if len(vvalues) and vvalues[0] == 1:
+        rises = np.concatenate((vtimes[:1], rises))
+    return rises, value_at(data[0], data[1], rises, before=0)
+
+
+def compare(name, got, got_times, expected, show):
+    """ print how got lines up with expected; True if they're the same """
+    count = min(len(got), len(expected))
+    wrong = np.flatnonzero(got[:count] != expected[:count])
+    ok = len(wrong) == 0 and len(got) == len(expected)
+    print("%-24s %9d bytes, %9d expected, %6d wrong  %s"
+          % (name, len(got), len(expected), len(wrong), "ok" if ok else "FAIL"))
+    for i in wrong[:show]:
+        print("    byte %d at %d: 0x%02x, expected 0x%02x" % (i, got_times[i], got[i], expected[i]))
+    if len(got) != len(expected) and not len(wrong[:show]):
+        extra = "got" if len(got) > len(expected) else "missing"
+        print("    %s %d bytes from byte %d" % (extra, abs(len(got) - len(expected)), count))
+    return ok
+
+
+def check(header, streams, show=5):
+    """ run every check the header lists, printing a line each; True if they all passed """
+    bit_time = header["bit_time"]
+    ok = True
+    for line, expected in sorted(header["lines"].items()):
+        starts, data, framing, skewed = decode_line(streams[line][0], streams[line][1], bit_time)
+        ok &= compare("%s frames" % line, data, starts, streams[expected][1], show)
+        errors = np.flatnonzero(framing)
+        print("%-24s %9d framing errors, %d edges off a bit boundary  %s"
+              % (line, len(errors), len(skewed), "ok" if not len(errors) and not len(skewed) else "FAIL"))
+        for i in errors[:show]:
+            print("    frame %d at %d" % (i, starts[i]))
+        for t in skewed[:show]:
+            print("    edge at %d" % t)
+        ok &= not len(errors) and not len(skewed)
+    for valid, data, expected in header["strobes"]:
+        times, values = strobed(streams[valid], streams[data])
+        ok &= compare("%s on %s" % (data, valid), values, times, streams[expected][1], show)
+    return ok
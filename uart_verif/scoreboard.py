@@ -0,0 +1,142 @@
+"""
+Transaction level scoreboard for the uart testbenches.
+
+Expectations are whole bytes or frames (ints), kept in a deque per
+monitored interface and checked off in order as the monitor reports
+them. The scoreboard's depth bounds every queue: expecting more than
+that without output fails the test. Only running counts are kept, not
+the transactions, so a long regression runs in constant memory.
+"""
+from collections import deque
+
+from cocotb.log import SimLog
+from cocotb.result import TestFailure, TestSuccess
+from cocotb.utils import get_sim_time
+
+DEPTH = 1 << 16
+
+
+class Expected(object):
+    """
+    the queue of expected transactions for one interface. testbenches
+    extend it like the list cocotb's Scoreboard takes; the scoreboard's
+    expect() does the queueing.
+    """
+    def __init__(self, scoreboard, name):
+        self.scoreboard = scoreboard
+        self.name = name
+        self.queue = deque()
+
+    def append(self, value):
+        self.scoreboard.expect(self, [value])
+
+    def extend(self, values):
+        self.scoreboard.expect(self, values)
+
+    def clear(self):
+        self.queue.clear()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __iter__(self):
+        return iter(self.queue)
+
+
+class UartScoreboard(object):
+    """
+    check monitored transactions against expected ones, in order.
+
+    add_interface() hooks a monitor up and returns the Expected queue the
+    model should fill. with fail_immediately, the first mismatch fails the
+    test, as with cocotb's Scoreboard; otherwise mismatches are counted and
+    show up in result.
+    """
+    def __init__(self, dut, depth=DEPTH, fail_immediately=True):
+        self.dut = dut
+        self.depth = depth
+        self.fail_immediately = fail_immediately
+        self.log = SimLog("cocotb.scoreboard.%s" % dut._name)
+        self.interfaces = []
+        self.matched = 0
+        self.mismatched = 0
+        self.flushed = 0
+        self.max_depth = 0
+        self.start_time = get_sim_time("ns")
+        self.first_mismatch = None
+
+    def add_interface(self, monitor, name=None):
+        expected = Expected(self, name or getattr(monitor, "name", type(monitor).__name__))
+        self.interfaces.append(expected)
+
+        def check(transaction):
+            self.compare(expected, transaction)
+        # what the profiler calls it
+        check.__qualname__ = "%s.compare" % type(self).__name__
+        monitor.add_callback(check)
+        return expected
+
+    @property
+    def outstanding(self):
+        return sum(len(expected) for expected in self.interfaces)
+
+    def expect(self, expected, values):
+        """
+        queue values on expected, one of the add_interface() queues.
+        more than depth of them waiting fails the test
+        """
+        values = list(values)
+        if len(expected.queue) + len(values) > self.depth:
+            raise TestFailure("%s: more than %d transactions expected without output"
+                              % (expected.name, self.depth))
+        expected.queue.extend(values)
+        self.max_depth = max(self.max_depth, len(expected.queue))
+
+    def compare(self, expected, got):
+        if not expected.queue:
+            self._mismatch(expected, "received %s but wasn't expecting anything", _fmt(got))
+            return
+        value = expected.queue.popleft()
+        if got != value:
+            self._mismatch(expected, "received %s, expected %s", _fmt(got), _fmt(value))
+            return
+        self.matched += 1
+
+    def _mismatch(self, expected, msg, *args):
+        self.mismatched += 1
+        self.log.error("%s: " + msg, expected.name, *args)
+        if self.first_mismatch is None:
+            # from the start of the test, which is what a rerun of it alone sees
+            self.first_mismatch = get_sim_time("ns") - self.start_time
+        if self.fail_immediately:
+            raise TestFailure("Received transaction differed from expected transaction %d ns into the test"
+                              % self.first_mismatch)
+
+    def flush(self):
+        """ drop everything still expected, e.g. when the dut goes into reset """
+        for expected in self.interfaces:
+            self.flushed += len(expected)
+            expected.clear()
+
+    def stats(self):
+        return {"matched": self.matched, "mismatched": self.mismatched,
+                "outstanding": self.outstanding, "max_depth": self.max_depth,
+                "flushed": self.flushed}
+
+    @property
+    def result(self):
+        self.log.info("matched %(matched)d, mismatched %(mismatched)d, "
+                      "outstanding %(outstanding)d, max depth %(max_depth)d", self.stats())
+        if self.outstanding:
+            for expected in self.interfaces:
+                if expected.queue:
+                    self.log.error("%s: %d transactions never came out, next is %s",
+                                   expected.name, len(expected), _fmt(expected.queue[0]))
+            return TestFailure("Not all expected output was received")
+        if self.mismatched:
+            return TestFailure("Errors were recorded during the test")
+        return TestSuccess()
+
+
+def _fmt(value):
+    return "0x%x" % value if isinstance(value, int) else repr(value)
@@ -0,0 +1,42 @@
+"""
+Splitting one long test across simulator processes.
+
+tools/stress.py runs a test K times at once, each in a simulator of its
+own with UART_SHARD set to i/K (0 <= i < K). A stream test sends only
+its shard's slice of the stream, from Shard.range(). A seeded test needs
+nothing from here: the runner hands each shard a seed of its own. Either
+way, a sharded test records its frames and throughput with
+uart_verif.bench.Measure for the runner to add up. Without UART_SHARD a
+test is the one and only shard, and records nothing.
+"""
+import os
+
+from uart_verif.bench import OUTPUT, Measure
+
+SHARD = os.environ.get("UART_SHARD")
+
+
+class Shard(object):
+    """ which of the shards of a test this is, from spec ("i/K", UART_SHARD) """
+    def __init__(self, spec=SHARD):
+        self.sharded = bool(spec)
+        self.index, self.count = 0, 1
+        if spec:
+            index, _, count = spec.partition("/")
+            self.index, self.count = int(index), int(count)
+            if not 0 <= self.index < self.count:
+                raise ValueError("UART_SHARD %s isn't i/K with 0 <= i < K" % spec)
+        self.measure = None
+
+    def range(self, total):
+        """ (start, stop) of this shard's share of total, the shards' shares covering it in order """
+        return total * self.index // self.count, total * (self.index + 1) // self.count
+
+    def start(self, name, clk_period=1.0, output=OUTPUT):
+        """ start timing the part of the test the shards split, to record in output """
+        self.measure = Measure(name, clk_period, output)
+
+    def done(self, frames, **extra):
+        """ record the frames this shard put through and how long it took, if sharded """
+        if self.sharded and self.measure is not None:
+            return self.measure.done(frames=frames, shard=self.index, shards=self.count, **extra)
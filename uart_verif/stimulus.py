@@ -0,0 +1,284 @@
+"""
+Seeded constrained-random traffic for the uart testbenches.
+
+A Stimulus turns one seed into two lazy streams of events, one for the
+rx line and one for the tx inputs, so a run of any length holds no more
+than the event being driven. The constraints come from the rtl, so every
+event has an outcome the model can predict:
+- DATA, a run of up to CHUNK bytes sent back to back, random or corner values
+- GAP, idle clocks between runs
+- GLITCH (rx), the line dropping for no more than half a bit, so uart_rx
+  goes back to IDLE without a character
+- BREAK (rx), the line held low for a frame or two, rising in the middle
+  of a bit so the frame it rises in is known exactly
+- RESET, rstn pulsed part way through a frame
+- POKE (tx), start pulsed with the transmitter most likely busy
+
+RxStress and TxStress walk a stream into a testbench's drivers. The seed
+comes from UART_SEED, or is drawn at random and logged, and the stream's
+length in bytes from UART_STRESS_BYTES; the same seed, length and BAUD
+give the same traffic, clock for clock. Given a coverage sampler (see
+uart_verif.coverage) they stop early once its target is reached, so
+the length is then a cap.
+"""
+import contextlib
+import os
+import random
+from collections import Counter
+
+import numpy as np
+
+import cocotb
+from cocotb.triggers import FallingEdge, RisingEdge, Timer
+from cocotb.utils import get_sim_time
+
+from uart_verif.drivers import FRAMES
+
+SEED = os.environ.get("UART_SEED")
+COUNT = int(os.environ.get("UART_STRESS_BYTES", 2000))
+
+DATA = "data"
+GAP = "gap"
+GLITCH = "glitch"
+BREAK = "break"
+RESET = "reset"
+POKE = "poke"
+
+# relative weights of each event
+RX_MIX = ((DATA, 70), (GAP, 10), (GLITCH, 8), (BREAK, 6), (RESET, 6))
+TX_MIX = ((DATA, 70), (GAP, 10), (POKE, 12), (RESET, 8))
+
+# most bytes in one back to back run
+CHUNK = 64
+CORNERS = (0x00, 0xff, 0x55, 0xaa, 0x01, 0x80, 0x7f, 0xfe)
+
+
+def _pick(rng, mix):
+    roll = rng.random() * sum(weight for _, weight in mix)
+    for kind, weight in mix:
+        roll -= weight
+        if roll < 0:
+            return kind
+    return mix[-1][0]
+
+
+def break_clocks(baud, frames, bit):
+    """
+    how long, in clocks from the line falling, to hold it low so uart_rx
+    takes frames whole frames as breaks and sees it rise half way between
+    sampling bits bit - 1 and bit of the next.
+
+    held low, uart_rx goes back to IDLE at each low stop bit and starts
+    again, so after the first frame it restarts every 9 * BAUD + BAUD / 2
+    + 7 clocks. it samples bit i 3 + BAUD / 2 + i * BAUD clocks into each.
+    """
+    half = baud // 2
+    restart = 9 * baud + half + 7
+    return 3 + frames * restart + half + (bit - 1) * baud + baud // 2
+
+
+class Stimulus(object):
+    """
+    the traffic for one seed. baud is the dut's clocks per bit; count is
+    how many bytes of DATA each stream sends before it ends.
+    """
+    def __init__(self, baud, seed=None, count=None):
+        if seed is None:
+            seed = int(SEED) if SEED else random.SystemRandom().getrandbits(32)
+        self.baud = baud
+        self.seed = seed
+        self.count = COUNT if count is None else count
+
+    def rerun(self):
+        return "UART_SEED=%d UART_STRESS_BYTES=%d" % (self.seed, self.count)
+
+    @contextlib.contextmanager
+    def reporting(self, log):
+        """ log the seed up front, and again with how to rerun it if anything fails """
+        log.info("stimulus seed %d, %d bytes a stream", self.seed, self.count)
+        try:
+            yield self
+        except BaseException:
+            log.error("failed with stimulus seed %d, %s reruns it exactly", self.seed, self.rerun())
+            raise
+
+    def _data(self, rng, left):
+        count = min(left, rng.randint(1, CHUNK))
+        if rng.random() < 0.25:
+            return bytes(rng.choice(CORNERS) for _ in range(count))
+        return rng.getrandbits(8 * count).to_bytes(count, "little")
+
+    def rx(self):
+        """ rx line events, each a tuple starting with its kind """
+        rng = random.Random("rx %d" % self.seed)
+        baud = self.baud
+        left = self.count
+        while left > 0:
+            kind = _pick(rng, RX_MIX)
+            if kind == DATA:
+                data = self._data(rng, left)
+                left -= len(data)
+                yield (DATA, data)
+            elif kind == GAP:
+                yield (GAP, rng.randint(1, 3 * baud))
+            elif kind == GLITCH:
+                # short enough that the start bit check throws it away;
+                # under a clock it may not be seen at all
+                if rng.random() < 0.25:
+                    width = rng.uniform(0.05, 0.95)
+                else:
+                    width = rng.randint(1, max(1, baud // 2))
+                yield (GLITCH, width)
+            elif kind == BREAK:
+                frames = rng.randint(1, 2)
+                bit = rng.randint(1, 9)
+                rows = [[0] * 10] * frames + [[0] * bit + [1] * (10 - bit)]
+                # high until the frame it rose in is done, and a bit more
+                yield (BREAK, break_clocks(baud, frames, bit), rows, (11 - bit) * baud)
+            else:
+                # stop before the stop bit's sampled, so no byte comes out
+                yield (RESET, rng.getrandbits(8), rng.randint(1, 9 * baud + baud // 2),
+                       rng.randint(1, 2 * baud))
+
+    def tx(self, resets=True):
+        """ tx input events; without resets, for when the rx stream owns rstn """
+        rng = random.Random("tx %d" % self.seed)
+        baud = self.baud
+        mix = TX_MIX if resets else tuple(item for item in TX_MIX if item[0] != RESET)
+        left = self.count
+        while left > 0:
+            kind = _pick(rng, mix)
+            if kind == DATA:
+                data = self._data(rng, left)
+                left -= len(data)
+                yield (DATA, data)
+            elif kind == GAP:
+                yield (GAP, rng.randint(1, 3 * baud))
+            elif kind == POKE:
+                yield (POKE, rng.randint(0, 10 * baud), rng.getrandbits(8))
+            else:
+                yield (RESET, rng.randint(1, 10 * baud), rng.randint(1, 2 * baud))
+
+
+class RxStress(object):
+    """
+    walk rx events into a uart receiver. DATA goes through driver (a
+    UartRxDriver, which hands it to the model); the rest is driven on its
+    line here, with a bit of idle line either side so the dut starts each
+    one from IDLE. GAPs are just idle line after the frame before. expect
+    is given the sampled frame bits of each break, reset(duration) is a
+    coroutine holding the dut in reset and coverage an RxCoverage.
+    """
+    def __init__(self, driver, reset, expect, coverage=None):
+        self.driver = driver
+        self.line = driver.rx
+        self.clock = driver.clock
+        self.baud = driver.baud
+        self.reset = reset
+        self.expect = expect
+        self.coverage = coverage
+        self.counts = Counter()
+
+    @cocotb.coroutine
+    def run(self, events):
+        line, clock = self.line, self.clock
+        yield RisingEdge(clock)
+        edge = get_sim_time()
+        yield RisingEdge(clock)
+        clk = get_sim_time() - edge
+        bit = self.baud * clk
+        coverage = self.coverage
+        for event in events:
+            if coverage is not None and coverage.done():
+                break
+            kind = event[0]
+            self.counts[kind] += 1
+            if kind == DATA:
+                self.counts["bytes"] += len(event[1])
+                yield self.driver.send(event[1])
+                continue
+            if kind == GAP:
+                yield Timer(event[1] * clk)
+                continue
+            yield Timer(bit)
+            yield RisingEdge(clock)
+            if kind == GLITCH:
+                if coverage is not None:
+                    coverage.glitch(event[1])
+                line <= 0
+                yield Timer(max(1, int(event[1] * clk)))
+                line <= 1
+            elif kind == BREAK:
+                _, low, rows, high = event
+                self.expect(np.array(rows, dtype=np.uint8))
+                line <= 0
+                yield Timer(low * clk)
+                line <= 1
+                yield Timer(high * clk)
+            elif kind == RESET:
+                _, byte, at, hold = event
+                frame = FRAMES[byte]
+                i = 0
+                while at > 0:
+                    line <= (frame >> i) & 1
+                    step = min(self.baud, at)
+                    yield Timer(step * clk)
+                    at -= step
+                    i += 1
+                # between clock edges, so nothing sampling on one races it
+                yield FallingEdge(clock)
+                line <= 1
+                if coverage is not None:
+                    coverage.reset(event[2] // self.baud)
+                yield self.reset(hold * clk)
+            yield Timer(bit)
+
+
+class TxStress(object):
+    """
+    walk tx events into a uart transmitter through driver (a
+    UartTxDriver). pokes pulse its start and data directly; the input
+    monitor decides whether the dut took them. reset(duration) is a
+    coroutine holding the dut in reset, needed if the stream has resets.
+    coverage, a TxCoverage, samples the traffic from the testbench's own
+    callbacks and is only asked here whether to stop.
+    """
+    def __init__(self, driver, reset=None, coverage=None):
+        self.driver = driver
+        self.clock = driver.clock
+        self.reset = reset
+        self.coverage = coverage
+        self.counts = Counter()
+
+    @cocotb.coroutine
+    def run(self, events):
+        clock = self.clock
+        yield RisingEdge(clock)
+        edge = get_sim_time()
+        yield RisingEdge(clock)
+        clk = get_sim_time() - edge
+        coverage = self.coverage
+        for event in events:
+            if coverage is not None and coverage.done():
+                break
+            kind = event[0]
+            self.counts[kind] += 1
+            if kind == DATA:
+                self.counts["bytes"] += len(event[1])
+                yield self.driver.send(event[1])
+            elif kind == GAP:
+                yield Timer(event[1] * clk)
+            elif kind == POKE:
+                _, delay, data = event
+                if delay:
+                    yield Timer(delay * clk)
+                yield RisingEdge(clock)
+                self.driver.data <= data
+                self.driver.start <= 1
+                yield RisingEdge(clock)
+                self.driver.start <= 0
+            elif kind == RESET:
+                _, at, hold = event
+                yield Timer(at * clk)
+                yield FallingEdge(clock)
+                yield self.reset(hold * clk)
@@ -0,0 +1,99 @@
+"""
+Cheap instrumentation for monitors and models.
+
+Hot paths guard their debug logging with debug_enabled() so nothing is
+formatted while the loggers sit at INFO, and pass arguments to the logger
+rather than %-formatting them up front. The sim time is already part of
+every log line, so there's no need to ask for it.
+
+For post mortem debugging, a TraceBuffer keeps the last N (sim_time,
+signal, value) records in preallocated arrays. It is only written out if
+the test fails. Set UART_TRACE_DEPTH to the number of records to keep;
+0 (the default) turns tracing off and monitors skip it entirely.
+"""
+import functools
+import logging
+import os
+from array import array
+
+import cocotb
+from cocotb.utils import get_sim_time
+
+DEPTH = int(os.environ.get("UART_TRACE_DEPTH", "0"))
+
+_active = None
+
+
+def debug_enabled(log):
+    """ True if log would emit a debug message """
+    return log.isEnabledFor(logging.DEBUG)
+
+
+def active():
+    """ the trace buffer of the running test, or None if tracing is off """
+    return _active
+
+
+class TraceBuffer(object):
+    """ fixed size ring of (sim_time, signal, value) records """
+    def __init__(self, depth):
+        self.depth = depth
+        self.times = array('Q', [0]) * depth
+        self.signals = array('H', [0]) * depth
+        self.values = array('q', [0]) * depth
+        self.names = []
+        self.ids = {}
+        self.count = 0
+
+    def signal(self, name):
+        """ the id to record values of signal name under """
+        sig = self.ids.get(name)
+        if sig is None:
+            sig = len(self.names)
+            self.ids[name] = sig
+            self.names.append(name)
+        return sig
+
+    def record(self, signal, value):
+        i = self.count % self.depth
+        self.times[i] = get_sim_time()
+        self.signals[i] = signal
+        self.values[i] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.depth)
+
+    def __iter__(self):
+        # oldest record first
+        for n in range(self.count - len(self), self.count):
+            i = n % self.depth
+            yield self.times[i], self.names[self.signals[i]], self.values[i]
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for time, name, value in self:
+                f.write("%d %s %d\n" % (time, name, value))
+
+
+def dump_on_failure(test):
+    """
+    wrap a test so it runs with a fresh trace buffer, and the buffer is
+    written to <test name>.trace if the test fails or is killed.
+    goes between @cocotb.test() and the test function.
+    """
+    @functools.wraps(test)
+    def wrapper(dut, *args, **kwargs):
+        global _active
+        _active = TraceBuffer(DEPTH) if DEPTH else None
+        passed = False
+        try:
+            yield from test(dut, *args, **kwargs)
+            passed = True
+        finally:
+            if not passed and _active is not None:
+                path = "%s.trace" % test.__name__
+                _active.dump(path)
+                cocotb.log.info("wrote the last %d trace records to %s", len(_active), path)
+            _active = None
+    return wrapper
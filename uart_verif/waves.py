@@ -0,0 +1,73 @@
+"""
+Waveform control for the uart top level.
+
+uart.v only dumps when vvp gets +waves=<file> (make WAVES=1 in uart/test),
+and even then it starts paused. A Waves turns dumping on and off from the
+testbench by writing the dut's waves reg, according to UART_WAVES:
+
+    off     nothing is dumped (the default)
+    on      the whole of each test
+    window  UART_WAVES_WINDOW=<start>:<end>, in ns from the start of the
+            test; leave end off to dump through to the end
+    around  UART_WAVES_FRAMES frames (default 4) either side of
+            UART_WAVES_AROUND=<ns>, the time into the test a scoreboard
+            mismatch was reported at by an earlier run
+
+tools/regress.py --waves reruns failing tests on their own with these set.
+"""
+import os
+
+import cocotb
+from cocotb.triggers import Timer
+
+MODE = os.environ.get("UART_WAVES", "off")
+WINDOW = os.environ.get("UART_WAVES_WINDOW", "")
+AROUND = os.environ.get("UART_WAVES_AROUND", "")
+FRAMES = int(os.environ.get("UART_WAVES_FRAMES", "4"))
+
+
+class Waves(object):
+    """ switch the dump of dut on and off; frame_time is one frame in ns """
+    def __init__(self, dut, frame_time):
+        self.dut = dut
+        self.frame_time = frame_time
+        self.handle = getattr(dut, "waves", None)
+
+    def window(self):
+        """ (start, end) in ns from the start of the test, end None for no end, or None for no dump """
+        if MODE == "on":
+            return 0, None
+        if MODE == "window":
+            start, _, end = WINDOW.partition(":")
+            return int(start or 0), int(end) if end else None
+        if MODE == "around":
+            if not AROUND:
+                raise ValueError("UART_WAVES is around, but UART_WAVES_AROUND doesn't say around when")
+            around = int(AROUND)
+            return max(around - FRAMES * self.frame_time, 0), around + FRAMES * self.frame_time
+        if MODE != "off":
+            raise ValueError("UART_WAVES should be off, on, window or around, not %r" % MODE)
+        return None
+
+    def start(self):
+        """ set the dump going for this test """
+        window = self.window()
+        if window is None:
+            return
+        if self.handle is None:
+            self.dut._log.warning("UART_WAVES is %s, but %s has no waves control", MODE, self.dut._name)
+            return
+        # a test before this one may have left it on
+        self.handle <= 0
+        cocotb.fork(self._control(*window))
+
+    @cocotb.coroutine
+    def _control(self, start, end):
+        if start > 0:
+            yield Timer(start, units="ns")
+        self.dut._log.info("waveform dump on")
+        self.handle <= 1
+        if end is not None:
+            yield Timer(end - start, units="ns")
+            self.handle <= 0
+            self.dut._log.info("waveform dump off")